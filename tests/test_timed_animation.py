@@ -0,0 +1,112 @@
+""" Timed animations count their duration in rendered frames and hand back to the state animation
+on the exact frame they end. Frames are stepped by hand, no clock is involved.
+
+Run from the repository root with:
+    python3 -m pytest tests
+"""
+import argparse
+import configparser
+import os
+import time
+
+import pytest
+
+from ui.components.animations import Timed_Animation
+from ui.linto_ui import FILE_PATH, Linto_UI
+
+
+@pytest.fixture(scope='module')
+def ui():
+    config = configparser.ConfigParser()
+    config.read(os.path.join(FILE_PATH, "config.conf"))
+    config = config['CONFIG']
+    # Nothing is read from or written to the user cache
+    config['disk_cache'] = ''
+    config['manifest_bundle'] = ''
+    args = argparse.Namespace(resolution=[800, 480], fullscreen=False, time=False, debug=False,
+                              headless=True, profile=False, hot_reload=False)
+    ui = Linto_UI(args, config)
+    deadline = time.monotonic() + 5
+    while ui.event_manager.broker is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield ui
+    ui.end()
+    ui.event_manager.join(5)
+
+
+@pytest.fixture
+def idle(ui):
+    """ The UI in the idle state, with its events applied"""
+    ui.set_mode('command')
+    ui.set_state('idle')
+    ui.event_manager.process_events()
+    return ui
+
+
+def timed_animation(ui, name: str) -> Timed_Animation:
+    return Timed_Animation(ui.screen, ui.animations.manifests[name], None)
+
+
+@pytest.mark.parametrize('name', ['happy', 'angry', 'waking_up'])
+def test_finishes_after_duration_frames(ui, name):
+    animation = timed_animation(ui, name)
+    animation.start()
+    animation.update() # First frame shown, not counted
+    for _ in range(animation.duration - 1):
+        animation.update()
+        assert not animation.finished
+    animation.update()
+    assert animation.finished
+
+
+def test_ticks_before_start_are_not_counted(ui):
+    animation = timed_animation(ui, 'happy')
+    animation.update(animation.duration - 1)
+    animation.start()
+    assert animation.frames_left == animation.duration
+    animation.update(animation.duration) # Elapsed before the animation was displayed
+    assert not animation.finished
+    assert animation.frames_left == animation.duration
+
+
+def test_ticks_add_up(ui):
+    animation = timed_animation(ui, 'happy')
+    animation.start()
+    animation.update()
+    animation.update(animation.duration - 1)
+    assert animation.next_change(1 / 30) == 1
+    animation.update(2)
+    assert animation.finished
+
+
+def test_hands_back_on_the_last_frame(idle):
+    idle.play_anim('happy')
+    happy = idle.render_sprites
+    assert happy.id == 'happy'
+    idle.update_sprites(100) # Frame shown when the animation starts
+    for _ in range(happy.duration - 1):
+        idle.update_sprites(1)
+        assert idle.render_sprites is happy
+    idle.update_sprites(1)
+    assert idle.render_sprites.id == idle.current_mode.current_state.animation == 'idle'
+    assert idle.animations.active == 'idle'
+
+
+def test_hands_back_with_skipped_frames(idle):
+    idle.play_anim('happy')
+    happy = idle.render_sprites
+    idle.update_sprites(1)
+    idle.update_sprites(happy.duration - 1)
+    assert idle.render_sprites is happy
+    idle.update_sprites(3) # Frames dropped by a slow render
+    assert idle.render_sprites.id == 'idle'
+
+
+def test_hands_back_to_the_current_state(idle):
+    idle.play_anim('happy')
+    happy = idle.render_sprites
+    idle.set_state('sleeping')
+    idle.play_anim(happy)
+    for _ in range(happy.duration + 1):
+        idle.update_sprites(1)
+    assert idle.render_sprites.id == idle.states['sleeping'].animation
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+""" Rendering benchmarks for the LinTo UI.
+
+Run from the repository root with:
+    python3 -m ui.benchmark [-r WIDTH HEIGHT] [-n FRAMES] [-m MESSAGES] [-s SOUNDS] [blit] [dispatch] [sound] [frames]
+
+The frames suite can save its results as a baseline and compare a later run against it:
+    python3 -m ui.benchmark frames --save-baseline baseline.json
+    python3 -m ui.benchmark frames --baseline baseline.json
+"""
+import argparse
+import configparser
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame as pg
+
+from ui.components import motion
+from ui.components.animations import Animation, Timed_Animation
+from ui.components.assets import asset_cache, surface_bytes
+from ui.components.dispatch import SOURCES, DispatchTable, Handler
+from ui.components.manifests import manifests
+from ui.components.sounds import SoundBank, pyaudio
+
+ALLOC_SLACK_KB = 16
+
+
+def load_animations(screen: pg.Surface) -> dict:
+    """ Build every animation found in the animations folder"""
+    animations = dict()
+    for manifest in manifests.folder('animations').values():
+        if manifest['type'] in ['timed']:
+            anim = Timed_Animation(screen, manifest, None)
+        else:
+            anim = Animation(screen, manifest, None)
+        animations[anim.id] = anim
+    return animations
+
+
+def blit_cost(screen: pg.Surface, animations: dict, frames: int) -> dict:
+    """ Returns the average time in ms spent drawing one frame of each animation"""
+    results = dict()
+    for name, anim in animations.items():
+        start = time.perf_counter()
+        for _ in range(frames):
+            anim.update()
+            anim.draw(screen)
+        results[name] = (time.perf_counter() - start) * 1000 / frames
+    return results
+
+
+def run_blit_cost(screen: pg.Surface, frames: int):
+    """ Compare per animation blit cost with unconverted and display format surfaces"""
+    results = dict()
+    for convert in [False, True]:
+        asset_cache.clear()
+        asset_cache.convert = convert
+        results[convert] = blit_cost(screen, load_animations(screen), frames)
+    asset_cache.clear()
+    asset_cache.convert = True
+
+    print("{:<20} {:>12} {:>12} {:>8}".format("animation", "raw (ms)", "converted", "gain"))
+    for name in results[False]:
+        before, after = results[False][name], results[True][name]
+        print("{:<20} {:>12.3f} {:>12.3f} {:>7.1f}x".format(name, before, after, before / after if after else 0))
+
+
+def load_events(folder: str, key: str) -> dict:
+    """ Returns a dict name -> events of the mode or state manifests in folder"""
+    return {manifest[key]: manifest['events'] for manifest in manifests.folder(folder).values()}
+
+
+def run_dispatch(messages: int):
+    """ Measure event dispatch throughput: table lookup and handler call for messages events"""
+    modes, states = load_events('modes', 'mode_name'), load_events('states', 'state_name')
+    calls = [0]
+    def count(payload):
+        calls[0] += 1
+    start = time.perf_counter()
+    table = DispatchTable()
+    table.compile(modes, states, lambda actions: Handler([count]))
+    compile_time = (time.perf_counter() - start) * 1000
+
+    # Every declared event of every (mode, state) pair plus one unknown topic per pair
+    events = []
+    for mode in modes:
+        for state in states:
+            for source in SOURCES:
+                for events_dict in [modes[mode], states[state]]:
+                    for topic, values in events_dict.get(source, {}).items():
+                        events.extend((mode, state, source, topic, value) for value in values)
+            events.append((mode, state, 'broker_message', 'unknown/topic', None))
+
+    start = time.perf_counter()
+    for i in range(messages):
+        handler = table.lookup(*events[i % len(events)])
+        if handler is not None:
+            for action in handler.actions:
+                action(None)
+    elapsed = time.perf_counter() - start
+    print("Dispatch table: {} entries compiled in {:.2f} ms".format(len(table), compile_time))
+    print("{} messages in {:.3f} s: {:.0f} msg/s, {:.2f} us/msg ({} handled)".format(
+          messages, elapsed, messages / elapsed, elapsed * 1e6 / messages, calls[0]))
+
+
+def run_sound_latency(plays: int, buffer_size: int):
+    """ Measure the time from play_sound to the first sample reaching the audio output.
+    Skipped without pyaudio or audio output device."""
+    if pyaudio is None:
+        print("Skipping sound: pyaudio is not installed")
+        return
+    audio = pyaudio.PyAudio()
+    try:
+        audio.get_default_output_device_info()
+    except OSError:
+        print("Skipping sound: no audio output device")
+        audio.terminate()
+        return
+    sounds = SoundBank(audio, buffer_size)
+    start = time.perf_counter()
+    sounds.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sounds'))
+    print("Decoded {} sounds in {:.1f} ms".format(len(sounds.sounds), (time.perf_counter() - start) * 1000))
+    start = time.perf_counter()
+    sounds.open()
+    print("Output stream opened in {:.1f} ms (previously paid on every sound)".format((time.perf_counter() - start) * 1000))
+    names = sorted(sounds.sounds)
+    for i in range(plays):
+        sounds.play(names[i % len(names)])
+        time.sleep(0.1)
+    time.sleep(0.5)
+    sounds.close()
+    audio.terminate()
+    stats = sounds.stats()
+    if stats['count']:
+        print("Trigger to first sample over {count} sounds: mean {mean:.2f} ms, max {max:.2f} ms".format(**stats))
+    else:
+        print("No sound reached the output")
+
+
+def headless_ui(resolution: list):
+    """ Returns a headless Linto_UI and its startup time in ms"""
+    from ui.linto_ui import FILE_PATH, Linto_UI
+    config = configparser.ConfigParser()
+    config.read(os.path.join(FILE_PATH, "config.conf"))
+    config = config['CONFIG']
+    # Startup is measured from the sources, without the user cache
+    config['disk_cache'] = ''
+    config['manifest_bundle'] = ''
+    args = argparse.Namespace(resolution=resolution, fullscreen=False, time=True, debug=False, headless=True, profile=False, hot_reload=False)
+    start = time.perf_counter()
+    ui = Linto_UI(args, config)
+    return ui, (time.perf_counter() - start) * 1000
+
+
+def play_frames(ui, frames: int) -> int:
+    """ Update and render frames frames of the displayed animation, returns the blitted area.
+    The motion clock advances of one frame period per frame, as if the UI ran at its frame rate.
+    """
+    groups = [ui.render_sprites, ui.overlay_sprites, ui.buttons_visible]
+    area = 0
+    for _ in range(frames):
+        motion_time[0] += ui.scheduler.frame_period
+        for group in groups:
+            group.update(1)
+        area += sum(rect.w * rect.h for rect in ui.renderer.render(groups))
+    return area
+
+
+motion_time = [0.0]
+
+def run_frames(resolution: list, frames: int) -> dict:
+    """ Play each animation for frames frames through the headless UI renderer"""
+    motion.clock = lambda: motion_time[0]
+    ui, startup = headless_ui(resolution)
+    results = {'resolution': resolution, 'frames': frames, 'startup_ms': startup, 'animations': dict()}
+    try:
+        for name in sorted(ui.animations.keys()):
+            ui.play_anim(name)
+            play_frames(ui, 1) # Full screen update of the animation change
+            start = time.perf_counter()
+            area = play_frames(ui, frames)
+            elapsed = time.perf_counter() - start
+
+            # Allocations are measured on a second run, tracing slows down the first one
+            ui.play_anim(name)
+            play_frames(ui, 1)
+            tracemalloc.start()
+            play_frames(ui, frames)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results['animations'][name] = {'ms_per_frame': elapsed * 1000 / frames,
+                                           'blit_area': area // frames,
+                                           'alloc_kb': peak / 1024}
+        results['sprites'] = animated_sprites_memory(ui)
+    finally:
+        ui.end()
+
+    print("Startup: {:.1f} ms".format(startup))
+    print("{:<20} {:>10} {:>14} {:>10}".format("animation", "ms/frame", "px blit/frame", "alloc KB"))
+    for name, result in results['animations'].items():
+        print("{:<20} {ms_per_frame:>10.3f} {blit_area:>14} {alloc_kb:>10.1f}".format(name, **result))
+    print("{:<28} {:>7} {:>10} {:>10}".format("animated sprite", "frames", "size", "KB"))
+    for name, sprite in sorted(results['sprites'].items()):
+        print("{:<28} {:>7} {:>10} {:>10.1f}".format(name, sprite['frames'], "{}x{}".format(*sprite['frame_size']), sprite['kb']))
+    return results
+
+
+def animated_sprites_memory(ui) -> dict:
+    """ Returns the memory in KB held by each animated sprite (animations and buttons), by sprite file"""
+    sprites = [sprite for name in ui.animations.keys() for sprite in ui.animations[name].sprites()]
+    sprites += list(ui.buttons.values())
+    memory = dict()
+    for sprite in sprites:
+        frames = getattr(sprite, 'frames', None)
+        if not frames:
+            continue
+        atlas = frames[0].get_parent() or frames[0]
+        memory[os.path.basename(sprite.sprite_path)] = {'frames': len(frames),
+                                                        'frame_size': list(frames[0].get_size()),
+                                                        'kb': (surface_bytes(atlas) + surface_bytes(frames)) / 1024}
+    return memory
+
+
+def compare_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """ Returns the regressions of results against baseline as strings.
+    Timings and allocations regress when they grow by more than tolerance, blit area on any growth.
+    Allocations are also given ALLOC_SLACK_KB of margin as a few KB vary from run to run.
+    """
+    regressions = []
+    def check(label, value, reference, margin, slack=0):
+        if reference is not None and value > reference * (1 + margin) + slack + 1e-9:
+            regressions.append("{}: {:.3f} (baseline {:.3f})".format(label, value, reference))
+    check('startup_ms', results['startup_ms'], baseline.get('startup_ms'), tolerance)
+    for name, result in results['animations'].items():
+        reference = baseline.get('animations', {}).get(name)
+        if reference is None:
+            continue
+        check(name + ' ms_per_frame', result['ms_per_frame'], reference.get('ms_per_frame'), tolerance)
+        check(name + ' blit_area', result['blit_area'], reference.get('blit_area'), 0)
+        check(name + ' alloc_kb', result['alloc_kb'], reference.get('alloc_kb'), tolerance, ALLOC_SLACK_KB)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LinTo UI rendering benchmarks')
+    parser.add_argument('suites', nargs='*', metavar='suite', help="Benchmarks to run: blit, dispatch, sound, frames (default all)")
+    parser.add_argument('-r', dest='resolution', type=int, nargs=2, default=[800,480], help="Screen resolution")
+    parser.add_argument('-n', dest='frames', type=int, default=100, help="Number of frames drawn per animation")
+    parser.add_argument('-m', dest='messages', type=int, default=100000, help="Number of dispatched messages")
+    parser.add_argument('-s', dest='sounds', type=int, default=20, help="Number of played sounds")
+    parser.add_argument('-b', dest='buffer_size', type=int, default=256, help="Frames per audio buffer")
+    parser.add_argument('--save-baseline', metavar='FILE', help="Save the frames results to FILE")
+    parser.add_argument('--baseline', metavar='FILE', help="Compare the frames results with FILE, exit with 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed relative slowdown against the baseline")
+    args = parser.parse_args()
+    suites = ['blit', 'dispatch', 'sound', 'frames']
+    for suite in args.suites:
+        if suite not in suites:
+            parser.error("Unknown benchmark {}".format(suite))
+    args.suites = args.suites or suites
+
+    if 'blit' in args.suites:
+        pg.display.init()
+        screen = pg.display.set_mode(args.resolution)
+        run_blit_cost(screen, args.frames)
+    if 'dispatch' in args.suites:
+        run_dispatch(args.messages)
+    if 'sound' in args.suites:
+        run_sound_latency(args.sounds, args.buffer_size)
+    if 'frames' in args.suites:
+        results = run_frames(args.resolution, args.frames)
+        if args.save_baseline:
+            with open(args.save_baseline, 'w') as f:
+                json.dump(results, f, indent=4)
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare_baseline(results, json.load(f), args.tolerance)
+            for regression in regressions:
+                print("REGRESSION " + regression)
+            if regressions:
+                sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,11 @@
 import os
 import logging
-import json
+import threading
+from collections import OrderedDict
 
 import pygame as pg
+from ui.components.assets import asset_cache
+from ui.components.manifests import ManifestError, manifests
 from ui.components.sprites import SpriteFactory
 from ui.components import ROOT_PATH
 
@@ -17,12 +20,12 @@ class Animation(pg.sprite.OrderedUpdates):
         self.load_manifest()
     def load_manifest(self):
         try:
-            placeholder_man = json.load(open(os.path.join(ROOT_PATH, "placeholders.json"), 'r'))
+            placeholder_man = manifests.placeholders
             draw_order = placeholder_man["draw_order"]
             placeholder_man = placeholder_man['placeholders']
             self.id = self.manifest['id']
             logging.debug("Loading %s animation" % self.id)
-        except FileNotFoundError:
+        except ManifestError:
             logging.error("Could not load placeholder manifest file")
             return
 
@@ -38,6 +41,11 @@ class Animation(pg.sprite.OrderedUpdates):
             #logging.debug("Adding sprite {}".format(sprite_name))
             self.add(SpriteFactory(os.path.join(ROOT_PATH, "sprites", sprite_name), sprite_mode, self.screen, placeholder_man[sprite_ph]))
 
+    def release(self):
+        """ Give back the sprites images to the asset cache"""
+        for sprite in self.sprites():
+            sprite.release()
+
     def __str__(self):
         return "<Animation: {} ({})>".format(self.id, self.sprites)
 
@@ -51,3 +59,133 @@ class Timed_Animation(Animation):
         else:
             logging.error("Unsupported animation type for {}".format(self.id))
             exit()
+        self.frames_left = self.duration
+        self._started = False
+
+    def start(self):
+        """ Rewind the animation. The next update shows its first frame and doesn't count."""
+        self.frames_left = self.duration
+        self._started = True
+
+    @property
+    def finished(self) -> bool:
+        return self.frames_left <= 0
+
+    def update(self, ticks: int = 1):
+        """ Advance the sprites and the frame count of ticks frames"""
+        if self._started:
+            self._started = False
+            return
+        Animation.update(self, ticks)
+        self.frames_left = max(0, self.frames_left - ticks)
+
+    def next_change(self, frame_period: float) -> int:
+        """ Number of frames before the animation ends"""
+        return max(1, self.frames_left)
+
+
+class AnimationRegistry:
+    """
+    Animations are built on demand. Manifests are read at startup and an Animation is built the first
+    time it is requested. Built animations are kept in least recently used order and released when
+    the asset cache holds more than the memory budget. Pinned animations and the active one are never released.
+    Animations can be requested from several threads.
+    """
+    def __init__(self, screen, render_group, budget: int = None, pinned: list = []):
+        """ Constructor
+
+        Keyword arguments:
+        screen -- the display surface
+        render_group -- the render group passed to the animations
+        budget -- memory budget in bytes, None for no limit
+        pinned -- names of the animations that must stay built
+        """
+        self.screen = screen
+        self.render_group = render_group
+        self.budget = budget
+        self.pinned = set(pinned)
+        self.active = None
+        self.manifests = dict()
+        self._built = OrderedDict()
+        self._generation = 0 # Incremented on reload
+        self._lock = threading.RLock()
+
+    def load(self, folder: str):
+        """Read all the .json animation manifests in folder"""
+        for manifest in manifests.folder(folder).values():
+            self.manifests[manifest['id']] = manifest
+        for name in self.pinned:
+            self.get(name)
+
+    def reload(self, folder: str, names: set):
+        """ Read the manifests of folder again and drop the built animations of names, they are rebuilt when next requested"""
+        reloaded = {manifest['id']: manifest for manifest in manifests.folder(folder).values()}
+        with self._lock:
+            self.manifests = reloaded
+            self._generation += 1
+            for name in names:
+                animation = self._built.pop(name, None)
+                if animation is not None:
+                    animation.release()
+        for name in self.pinned & set(names):
+            if name in self.manifests:
+                self.get(name)
+
+    def get(self, name: str) -> Animation:
+        """ Returns the animation, building it if needed"""
+        with self._lock:
+            if name in self._built:
+                self._built.move_to_end(name)
+                return self._built[name]
+            generation = self._generation
+        # Built without holding the lock so that other threads can get built animations meanwhile
+        manifest = self.manifests[name]
+        if manifest['type'] in ['timed']:
+            anim = Timed_Animation(self.screen, manifest, self.render_group)
+        else:
+            anim = Animation(self.screen, manifest, self.render_group)
+        with self._lock:
+            if generation != self._generation:
+                # Reloaded while building, the animation may use outdated manifests or images
+                anim.release()
+                return self.get(name)
+            if name in self._built:
+                # Built concurrently by another thread
+                anim.release()
+                self._built.move_to_end(name)
+                return self._built[name]
+            self._built[name] = anim
+            self._evict()
+        return anim
+
+    def is_built(self, name: str) -> bool:
+        with self._lock:
+            return name in self._built
+
+    def has_room(self) -> bool:
+        """ Returns True if the asset cache is within the memory budget"""
+        return self.budget is None or asset_cache.nbytes <= self.budget
+
+    def _evict(self):
+        """ Release least recently used animations until the asset cache fits in the budget"""
+        if self.budget is None:
+            return
+        asset_cache.trim()
+        latest = next(reversed(self._built))
+        for name in list(self._built.keys()):
+            if asset_cache.nbytes <= self.budget:
+                break
+            if name in self.pinned or name in [self.active, latest]:
+                continue
+            logging.debug("Releasing animation {}".format(name))
+            self._built.pop(name).release()
+            asset_cache.trim()
+
+    def __getitem__(self, name: str) -> Animation:
+        return self.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.manifests
+
+    def keys(self):
+        return self.manifests.keys()
@@ -0,0 +1,350 @@
+import hashlib
+import logging
+import math
+import os
+import struct
+import threading
+from typing import Union
+
+import pygame as pg
+
+from ui.components import ROOT_PATH
+
+
+def has_transparency(surface: pg.Surface) -> bool:
+    """ Returns True if at least one pixel of a per-pixel alpha surface is not fully opaque"""
+    if not surface.get_flags() & pg.SRCALPHA:
+        return False
+    w, h = surface.get_size()
+    return pg.mask.from_surface(surface, 254).count() < w * h
+
+
+def to_display_format(surface: pg.Surface) -> pg.Surface:
+    """ Converts a surface to the display pixel format so that blits do not convert pixels.
+    Per-pixel alpha is kept only if the image actually uses it.
+    Surfaces are returned unchanged if no display mode has been set.
+    """
+    if pg.display.get_surface() is None:
+        return surface
+    if has_transparency(surface):
+        return surface.convert_alpha()
+    return surface.convert()
+
+
+def surface_bytes(value: Union[pg.Surface, list]) -> int:
+    """ Returns the number of bytes held by a surface or a list of surfaces.
+    Subsurfaces share their parent's pixels and are not counted.
+    """
+    if isinstance(value, (list, tuple)):
+        return sum(surface_bytes(v) for v in value)
+    if value.get_parent() is not None:
+        return 0
+    return value.get_pitch() * value.get_height()
+
+
+class DiskCache:
+    """
+    On-disk store of scaled images in raw pixel format. Files are read in a single call
+    and turned into display format surfaces without decoding or scaling.
+    Files are keyed by the hash of the source image, the target size, the mode and the display resolution.
+    """
+    MAGIC = b'LUIC'
+    VERSION = 1
+    HEADER = struct.Struct('<4sBH')
+    SURFACE_HEADER = struct.Struct('<HHBB3B')
+
+    def __init__(self, folder: str, resolution: list):
+        """ Constructor
+
+        Keyword arguments:
+        folder -- the cache folder, created if needed
+        resolution -- the display resolution [width, height]
+        """
+        self.folder = folder
+        self.resolution = tuple(int(v) for v in resolution)
+        self._hashes = dict() # path -> (mtime, hash)
+        os.makedirs(folder, exist_ok=True)
+
+    def file_hash(self, path: str) -> str:
+        mtime = os.path.getmtime(path)
+        cached = self._hashes.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'rb') as f:
+                cached = self._hashes[path] = (mtime, hashlib.sha1(f.read()).hexdigest())
+        return cached[1]
+
+    def file_path(self, path: str, size: tuple, mode: str) -> str:
+        return os.path.join(self.folder, "{}_{}x{}_{}_{}x{}.raw".format(self.file_hash(path), size[0], size[1], mode, *self.resolution))
+
+    def load(self, path: str, size: tuple, mode: str):
+        """ Returns the cached surface or None if not cached"""
+        try:
+            with open(self.file_path(path, size, mode), 'rb') as f:
+                data = memoryview(f.read())
+            magic, version, count = self.HEADER.unpack_from(data)
+            if magic != self.MAGIC or version != self.VERSION:
+                return None
+            offset = self.HEADER.size
+            surfaces = []
+            for _ in range(count):
+                w, h, alpha, has_colorkey, *colorkey = self.SURFACE_HEADER.unpack_from(data, offset)
+                offset += self.SURFACE_HEADER.size
+                length = w * h * (4 if alpha else 3)
+                surface = pg.image.frombuffer(data[offset:offset + length], (w, h), 'RGBA' if alpha else 'RGB')
+                offset += length
+                if has_colorkey:
+                    surface.set_colorkey(colorkey)
+                surfaces.append(self._convert(surface, alpha))
+        except (OSError, struct.error, ValueError):
+            return None
+        return surfaces[0]
+
+    def store(self, path: str, size: tuple, mode: str, value: pg.Surface):
+        surfaces = [value]
+        chunks = [self.HEADER.pack(self.MAGIC, self.VERSION, len(surfaces))]
+        for surface in surfaces:
+            alpha = bool(surface.get_flags() & pg.SRCALPHA)
+            colorkey = surface.get_colorkey()
+            chunks.append(self.SURFACE_HEADER.pack(surface.get_width(), surface.get_height(), alpha,
+                                                   colorkey is not None, *(colorkey[:3] if colorkey else (0,0,0))))
+            chunks.append(pg.image.tostring(surface, 'RGBA' if alpha else 'RGB'))
+        file_path = self.file_path(path, size, mode)
+        try:
+            with open(file_path + '.tmp', 'wb') as f:
+                f.write(b''.join(chunks))
+            os.replace(file_path + '.tmp', file_path)
+        except OSError as e:
+            logging.warning("Could not write {}: {}".format(file_path, e))
+
+    def files(self, all_resolutions: bool = False) -> list:
+        """ Returns the cached files for the current resolution, or for every resolution"""
+        suffix = ".raw" if all_resolutions else "_{}x{}.raw".format(*self.resolution)
+        return [os.path.join(self.folder, f) for f in os.listdir(self.folder) if f.endswith(suffix)]
+
+    def clear(self, all_resolutions: bool = False):
+        """ Remove the cached files for the current resolution, or for every resolution"""
+        for file_path in self.files(all_resolutions):
+            os.remove(file_path)
+
+    @staticmethod
+    def _convert(surface: pg.Surface, alpha: bool) -> pg.Surface:
+        """ Copy a surface out of the file buffer, in the display format if possible"""
+        if pg.display.get_surface() is None:
+            return surface.copy()
+        return surface.convert_alpha() if alpha else surface.convert()
+
+
+class _Entry:
+    __slots__ = ('value', 'refs', 'nbytes')
+
+    def __init__(self, value):
+        self.value = value
+        self.refs = 0
+        self.nbytes = surface_bytes(value)
+
+
+class BakedAssets:
+    """
+    Sprite variants scaled offline with smoothscale for a set of screen resolutions (buckets).
+    Files are stored as <folder>/<W>x<H>/<image path relative to root>_<mode>_<w>x<h>.png.
+    At runtime the bucket nearest to the screen resolution is used: when it matches the screen,
+    baked images have the exact sizes requested and are loaded without any scaling. Otherwise the
+    closest variant of the image is scaled, which is faster and looks better than scaling the source.
+    """
+    def __init__(self, folder: str, root: str = ROOT_PATH):
+        """ Constructor
+
+        Keyword arguments:
+        folder -- folder of the baked variants
+        root -- folder the image paths are made relative to (default the ui folder)
+        """
+        self.folder = folder
+        self.root = root
+        self.bucket = None
+        self._variants = dict() # (relative path, mode) -> {size: file path}
+
+    def buckets(self) -> list:
+        """ Returns the resolutions baked in the folder"""
+        buckets = []
+        if os.path.isdir(self.folder):
+            for name in os.listdir(self.folder):
+                try:
+                    buckets.append(tuple(int(v) for v in name.split('x')))
+                except ValueError:
+                    continue
+        return sorted(b for b in buckets if len(b) == 2)
+
+    def select(self, resolution: list) -> tuple:
+        """ Use the bucket nearest to resolution and index its files. Returns the bucket or None."""
+        buckets = self.buckets()
+        if not buckets:
+            return None
+        distance = lambda b: abs(math.log(b[0] / resolution[0])) + abs(math.log(b[1] / resolution[1]))
+        self.bucket = min(buckets, key=distance)
+        self._variants = dict()
+        bucket_folder = os.path.join(self.folder, "{}x{}".format(*self.bucket))
+        for folder, _, files in os.walk(bucket_folder):
+            for file_name in files:
+                name, mode, size = file_name[:-4].rsplit('_', 2)
+                relative = os.path.relpath(os.path.join(folder, name), bucket_folder)
+                size = tuple(int(v) for v in size.split('x'))
+                self._variants.setdefault((relative, mode), dict())[size] = os.path.join(folder, file_name)
+        return self.bucket
+
+    def file_path(self, bucket: tuple, path: str, size: tuple, mode: str) -> str:
+        relative = os.path.splitext(os.path.relpath(path, self.root))[0]
+        return os.path.join(self.folder, "{}x{}".format(*bucket), "{}_{}_{}x{}.png".format(relative, mode, *size))
+
+    def load(self, path: str, size: tuple, mode: str) -> pg.Surface:
+        """ Returns the baked image at size or None if the image has no variant in the bucket"""
+        variants = self._variants.get((os.path.splitext(os.path.relpath(path, self.root))[0], mode))
+        if not variants:
+            return None
+        if size in variants:
+            return to_display_format(pg.image.load(variants[size]))
+        # Smallest variant larger than size, or the largest one
+        larger = [s for s in variants if s[0] >= size[0] and s[1] >= size[1]]
+        source = min(larger) if larger else max(variants)
+        return pg.transform.smoothscale(to_display_format(pg.image.load(variants[source])), size)
+
+    def discard(self, paths: set):
+        """ Forget the variants of source images modified since the bake, they are scaled from the source instead"""
+        relatives = {os.path.splitext(os.path.relpath(path, self.root))[0] for path in paths}
+        self._variants = {key: variants for key, variants in self._variants.items() if key[0] not in relatives}
+
+    def store(self, bucket: tuple, path: str, size: tuple, mode: str, image: pg.Surface):
+        file_path = self.file_path(bucket, path, size, mode)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        pg.image.save(image, file_path)
+
+
+class AssetCache:
+    """
+    Process-wide store of decoded and scaled images.
+    Entries are keyed by (path, size, mode) and reference counted: acquire() returns the
+    shared value and release() gives it back. Entries that are no longer referenced are
+    kept until trim() is called so that successive loads can reuse them.
+    Images are converted to the display format when they are decoded, unless convert is False.
+    If a DiskCache is set, scaled entries are read from and written to it. If BakedAssets are set,
+    scaled images missing from the disk cache are taken from the baked variants before being scaled at runtime,
+    and written to the disk cache either way.
+    With smooth, images are scaled with smoothscale (used when baking) instead of scale.
+    The cache can be used from several threads.
+    """
+    def __init__(self, convert: bool = True, disk: DiskCache = None):
+        self.convert = convert
+        self.disk = disk
+        self.baked = None
+        self.smooth = False
+        self._lock = threading.RLock()
+        self._entries = dict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(path: str, size: list = None, mode: str = 'image') -> tuple:
+        return (path, tuple(int(v) for v in size) if size is not None else None, mode)
+
+    def acquire(self, path: str, size: list = None, mode: str = 'image', loader=None):
+        """ Returns the cached value for (path, size, mode), loading it on a miss.
+
+        Keyword arguments:
+        path -- image file path
+        size -- target size [width, height] or None for the full scale image
+        mode -- kind of value stored under the key (default 'image')
+        loader -- callable returning the value on a miss (default: load and scale the image)
+        """
+        key = self.key(path, size, mode)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                value = None
+                disk = self.disk if self.convert and size is not None else None
+                if disk is not None:
+                    value = disk.load(*key)
+                if value is None:
+                    if self.baked is not None and size is not None:
+                        value = self.baked.load(*key)
+                    if value is None:
+                        value = loader() if loader is not None else self._load_image(path, key[1])
+                    if disk is not None:
+                        disk.store(*key, value)
+                entry = self._entries[key] = _Entry(value)
+            entry.refs += 1
+            return entry.value
+
+    def release(self, path: str, size: list = None, mode: str = 'image'):
+        """ Drops a reference previously obtained with acquire()"""
+        with self._lock:
+            entry = self._entries.get(self.key(path, size, mode))
+            if entry is not None and entry.refs > 0:
+                entry.refs -= 1
+
+    def trim(self) -> int:
+        """ Removes unreferenced entries and returns the number of bytes freed"""
+        freed = 0
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e.refs == 0]:
+                freed += self._entries.pop(key).nbytes
+        return freed
+
+    def invalidate(self, paths: set):
+        """ Drop every entry of the image files, referenced or not, so that they are loaded again.
+        Used when the files are modified on disk.
+
+        Keyword arguments:
+        paths -- image file paths
+        """
+        paths = {os.path.normpath(path) for path in paths}
+        with self._lock:
+            for key in [k for k in self._entries.keys() if os.path.normpath(k[0]) in paths]:
+                del self._entries[key]
+            if self.baked is not None:
+                self.baked.discard(paths)
+
+    def clear(self):
+        with self._lock:
+            self._entries = dict()
+            self.hits = 0
+            self.misses = 0
+
+    def _load_image(self, path: str, size: tuple) -> pg.Surface:
+        if size is None:
+            image = pg.image.load(path)
+            return to_display_format(image) if self.convert else image
+        image = self.acquire(path)
+        try:
+            return self.scale(image, size)
+        finally:
+            self.release(path)
+
+    def scale(self, surface: pg.Surface, size: list) -> pg.Surface:
+        """ Scale a surface with the cache scaling filter"""
+        if self.smooth and surface.get_bitsize() in [24, 32]:
+            return pg.transform.smoothscale(surface, size)
+        return pg.transform.scale(surface, size)
+
+    def scaled_entries(self) -> list:
+        """ Returns the (path, size, mode, value) of the scaled single image entries"""
+        with self._lock:
+            return [key + (e.value,) for key, e in self._entries.items()
+                    if key[1] is not None and isinstance(e.value, pg.Surface)]
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(e.nbytes for e in self._entries.values())
+
+    def stats(self) -> dict:
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self.nbytes}
+
+    def log_stats(self):
+        logging.debug("Asset cache: {hits} hits, {misses} misses, {entries} entries, {bytes} bytes".format(**self.stats()))
+
+asset_cache = AssetCache()
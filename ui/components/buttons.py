@@ -1,7 +1,7 @@
 import pygame as pg
-import json
 import time
 
+from ui.components.manifests import manifests
 from ui.components.sprites import Sprite, Animated_Sprite
 
 DOUBLE_CLICK_DELAY = 0.5
@@ -20,15 +20,17 @@ class Clickable:
         self.last_clicked = time.time()
     
     def _load_manifest(self, manifest_path):
-        with open(manifest_path, 'r') as f:
-            manifest = json.load(f)
-            self.id = manifest['name']
+        manifest = manifests.get(manifest_path)
+        self.id = manifest['name']
 
 class Empty_Button(pg.sprite.Sprite, Clickable):
     def __init__(self, manifest_path: str, event_manager: "Event Manager class"):
         pg.sprite.Sprite.__init__(self)
         Clickable.__init__(self, manifest_path, event_manager)
         self.image = pg.Surface([0,0])
+
+    def next_change(self, frame_period: float) -> int:
+        return None
     
     def set_rect(self, target_surface, rect, center=False):
         surface_size = target_surface.get_rect().size
@@ -59,8 +61,11 @@ class State_Button(Animated_Sprite, Clickable):
         Animated_Sprite.__init__(self, sprite_path)
         Clickable.__init__(self, manifest_path, event_manager)
     
-    def update(self):
+    def update(self, ticks: int = 1):
         pass
+
+    def next_change(self, frame_period: float) -> int:
+        return None
     
     def clicked(self):
         self.curr_frame = (self.curr_frame + 1) % self.nb_frames
@@ -68,12 +73,19 @@ class State_Button(Animated_Sprite, Clickable):
         self.event_manager.touch_input(self.id, str(self.curr_frame))
         self.updated = True
     
-    def set_state(self, state):
-        if 0 > state >= self.nb_frames:
+    def set_state(self, state, notify: bool = True):
+        """ Display the state frame
+
+        Keyword arguments:
+        state -- frame index
+        notify -- trigger the button_clicked event of the new state as if the button was clicked
+        """
+        if not 0 <= state < self.nb_frames:
             return
         self.curr_frame = state
         self.image = self.frames[self.curr_frame]
-        self.event_manager.touch_input(self.id, str(self.curr_frame))
+        if notify:
+            self.event_manager.touch_input(self.id, str(self.curr_frame))
         self.updated = True
         
 class Switch_Button(State_Button):
@@ -87,9 +99,13 @@ class Switch_Button(State_Button):
         self.event_manager.touch_input(self.id, 'true' if self.curr_frame else 'false')
         self.updated = True
     
-    def set_state(self, state: bool):
-        if state != self.curr_frame:
+    def set_state(self, state: bool, notify: bool = True):
+        if state == self.curr_frame:
+            return
+        if notify:
             self.clicked()
+        else:
+            super().set_state(int(state), notify=False)
 
 class Animated_Button(Animated_Sprite, Clickable):
     def __init__(self, sprite_path: str, manifest_path: str, event_manager):
@@ -110,28 +126,30 @@ class Animated_Switch_Button(Animated_Sprite, Clickable):
         self.updating = not self.updating
         self.event_manager.touch_input(self.id, 'true' if self.updating else 'false')
     
-    def update(self):
+    def update(self, ticks: int = 1):
         if self.updating:
-            super().update()
+            super().update(ticks)
+
+    def next_change(self, frame_period: float) -> int:
+        return super().next_change(frame_period) if self.updating else None
 
 def Button_Factory(manifest_path : str, target_surface : pg.Surface, event_manager : " Event Manager Class") -> Clickable:
-    with open(manifest_path, 'r') as f:
-        manifest = json.load(f)
-        button_type = manifest['type']
-        sprite_path = ".".join(manifest_path.split('.')[:-1]) + ".png"
-        if button_type == 'single':
-            button =  SimpleButton(sprite_path,manifest_path, event_manager)
-        elif button_type == 'state':
-            button =  State_Button(sprite_path, manifest_path, event_manager)
-        elif button_type == 'animated':
-            button =  Animated_Button(sprite_path, manifest_path, event_manager)
-        elif button_type == 'switch':
-            button =  Switch_Button(sprite_path, manifest_path, event_manager)
-        elif button_type == 'animated_switch':
-            button =  Animated_Switch_Button(sprite_path, manifest_path, event_manager)
-        elif button_type == 'void':
-            button = Empty_Button(manifest_path, event_manager)
-        else:
-            return None
-        button.set_rect(target_surface, manifest['rect'], center=True)
-        return button
\ No newline at end of file
+    manifest = manifests.get(manifest_path)
+    button_type = manifest['type']
+    sprite_path = ".".join(manifest_path.split('.')[:-1]) + ".png"
+    if button_type == 'single':
+        button =  SimpleButton(sprite_path,manifest_path, event_manager)
+    elif button_type == 'state':
+        button =  State_Button(sprite_path, manifest_path, event_manager)
+    elif button_type == 'animated':
+        button =  Animated_Button(sprite_path, manifest_path, event_manager)
+    elif button_type == 'switch':
+        button =  Switch_Button(sprite_path, manifest_path, event_manager)
+    elif button_type == 'animated_switch':
+        button =  Animated_Switch_Button(sprite_path, manifest_path, event_manager)
+    elif button_type == 'void':
+        button = Empty_Button(manifest_path, event_manager)
+    else:
+        return None
+    button.set_rect(target_surface, manifest['rect'], center=True)
+    return button
\ No newline at end of file
@@ -0,0 +1,96 @@
+import paho.mqtt.client as mqtt
+
+SOURCES = ['broker_message', 'button_clicked']
+WILDCARD = 'any'
+
+
+class Handler:
+    """ The pre-bound actions triggered by an event"""
+    __slots__ = ('actions', 'connexion')
+
+    def __init__(self, actions: list, connexion: bool = None):
+        """ Constructor
+
+        Keyword arguments:
+        actions -- list of callables taking the message payload
+        connexion -- connexion status set by the event, None if unchanged
+        """
+        self.actions = actions
+        self.connexion = connexion
+
+
+class DispatchTable:
+    """
+    Event responses of every (mode, state) pair compiled into a single dict.
+    Keys are (mode, state, source, topic or button) and values are the handlers of each event value.
+
+    Precedence rules: mode events take precedence over state events and, for each of them,
+    an exact value takes precedence over the 'any' wildcard. MQTT topic wildcards (+ and #) are
+    only tried when no exact topic matches.
+    """
+    def __init__(self):
+        self._table = dict()
+        self._wildcards = dict() # (mode, state, source) -> [(topic pattern, entry)]
+
+    def compile(self, modes: dict, states: dict, compile_actions):
+        """ Build the table
+
+        Keyword arguments:
+        modes -- dict mode name -> mode events
+        states -- dict state name -> state events
+        compile_actions -- callable turning an action dict into a Handler
+        """
+        self._table = dict()
+        self._wildcards = dict()
+        handlers = dict() # Actions shared by several (mode, state) pairs are compiled once
+        def handler(actions):
+            if id(actions) not in handlers:
+                handlers[id(actions)] = compile_actions(actions)
+            return handlers[id(actions)]
+
+        for mode_name, mode_events in modes.items():
+            for state_name, state_events in states.items():
+                for source in SOURCES:
+                    mode_triggers = mode_events.get(source, {})
+                    state_triggers = state_events.get(source, {})
+                    for topic in set(mode_triggers.keys()) | set(state_triggers.keys()):
+                        entry = self._merge(mode_triggers.get(topic, {}), state_triggers.get(topic, {}), handler)
+                        if '+' in topic or '#' in topic:
+                            self._wildcards.setdefault((mode_name, state_name, source), []).append((topic, entry))
+                        else:
+                            self._table[(mode_name, state_name, source, topic)] = entry
+
+    @staticmethod
+    def _merge(mode_values: dict, state_values: dict, handler) -> tuple:
+        """ Returns (dict value -> handler, default handler) for a topic or button"""
+        values = dict()
+        default = None
+        for triggers in [state_values, mode_values]:
+            for value, actions in triggers.items():
+                if value == WILDCARD:
+                    default = handler(actions)
+                else:
+                    values[value] = handler(actions)
+        if WILDCARD in mode_values:
+            # The mode wildcard shadows every state value
+            values = {v: handler(a) for v, a in mode_values.items() if v != WILDCARD}
+        return values, default
+
+    def lookup(self, mode: str, state: str, source: str, topic: str, value) -> Handler:
+        """ Returns the handler for an event or None"""
+        entry = self._table.get((mode, state, source, topic))
+        if entry is None:
+            for pattern, wildcard_entry in self._wildcards.get((mode, state, source), []):
+                if mqtt.topic_matches_sub(pattern, topic):
+                    entry = wildcard_entry
+                    break
+            else:
+                return None
+        values, default = entry
+        try:
+            return values.get(value, default)
+        except TypeError: # Unhashable value
+            return default
+
+    def __len__(self):
+        return len(self._table)
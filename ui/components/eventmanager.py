@@ -1,30 +1,57 @@
-import os
 import threading
 import datetime
 import logging
 import json
 import subprocess
-import time
 
 import paho.mqtt.client as mqtt
 import tenacity
-import alsaaudio
 
-from ui.components import ROOT_PATH
+from ui.components.dispatch import DispatchTable, Handler
+from ui.components.eventqueue import EventQueue
+from ui.components.manifests import manifests
+from ui.components.mixer import default_mixer
+from ui.components.profiler import null_profiler
 
 class Event_Manager(threading.Thread):
     """
     Event manager deal with the input from the MQTT broker and the touchscreen inputs.
     It matchs each input with the responses defined for the current mode or states.
     """
-    def __init__(self, ui : "UI class", config):
+    def __init__(self, ui : "UI class", config, mixer = None, client_factory = None):
+        """ Constructor
+
+        Keyword arguments:
+        ui -- the Linto_UI instance
+        config -- the CONFIG section of config.conf
+        mixer -- volume control exposing get_volume and set_volume (default AlsaMixer)
+        client_factory -- callable returning the MQTT client (default paho mqtt.Client)
+        """
         threading.Thread.__init__(self)
         self.config = config
         self.ui = ui
         self.alive = True
         self.connected = True
         self.broker = None
-        self.callback_guard = True #Prevent state callback to perform when an action has been performed during timeout counter
+        self.mixer = mixer if mixer is not None else default_mixer()
+        self.client_factory = client_factory if client_factory is not None else mqtt.Client
+        self.volume = None # Last applied and published volume
+        self._volume_timer = None
+        self._pending_volume = None
+        self.volume_debounce = config.getfloat('volume_debounce', fallback=0.1)
+        self.dispatch = DispatchTable()
+        self.profiler = null_profiler
+        self.queue = EventQueue(config.getint('event_queue_size', fallback=256))
+        self._action_binders = {'publish': self._bind_publish,
+                                'sound': self._bind_sound,
+                                'volume': self._bind_volume,
+                                'volume_set': self._bind_volume_set,
+                                'mode': self._bind_mode,
+                                'state': self._bind_state,
+                                'timeout': self._bind_timeout,
+                                'wuw_spotting': self._bind_wuw_spotting,
+                                'mute': self._bind_mute,
+                                'play': self._bind_play}
 
     @tenacity.retry(wait=tenacity.wait_fixed(5),
             stop=tenacity.stop_after_attempt(24),
@@ -34,7 +61,7 @@ class Event_Manager(threading.Thread):
     def broker_connect(self):
         logging.info("Attempting connexion to broker at %s:%i" % (self.config['broker_ip'], int(self.config['broker_port'])))
         try:
-            broker = mqtt.Client()
+            broker = self.client_factory()
             broker.on_connect = self._on_broker_connect
             broker.connect(self.config['broker_ip'], int(self.config['broker_port']), 0)
             broker.on_disconnect = self._on_broker_disconnect
@@ -42,7 +69,7 @@ class Event_Manager(threading.Thread):
             return broker
         except:
             logging.warning("Failed to connect to broker (Retrying after 5s)")
-            self.ui.play_anim('error')
+            self.queue.post(self.ui.play_anim, 'error')
             return None
     
     def end(self):
@@ -55,24 +82,13 @@ class Event_Manager(threading.Thread):
         subscribe to the relevant topics.
         """
         logging.info("Connected to broker")
-        topics = set() # Set of topics: Prevents duplicate
-        files = [] # List of json files
-
-        for file_name in [file_name for file_name in os.listdir(os.path.join(ROOT_PATH, 'modes')) if file_name.endswith('.json')]: 
-            file_path = os.path.join(ROOT_PATH, 'modes', file_name)
-            files.append(file_path)
-
-        for file_name in [file_name for file_name in os.listdir(os.path.join(ROOT_PATH, 'states')) if file_name.endswith('.json')]: 
-            file_path = os.path.join(ROOT_PATH, 'states', file_name)
-            files.append(file_path)
-        for file_path in files:
-            with open(file_path, 'r') as f:
-                manifest = json.load(f)
-                for topic_name in manifest['events']['broker_message']:
-                    topics.add(topic_name)
-        for topic in topics:
-            self.broker.subscribe(topic)
-            logging.debug("Subscribed to {}".format(topic))
+        self.subscribe(manifests.topics)
+
+    def subscribe(self, topics: list):
+        """ Subscribe to the topics, if connected. Topics are subscribed again on each connection."""
+        if topics and self.broker is not None:
+            self.broker.subscribe([(topic, 0) for topic in topics])
+            logging.debug("Subscribed to {}".format(", ".join(topics)))
 
     def _on_broker_disconnect(self, client, userdata, rc):
         logging.debug("Disconnection")
@@ -81,9 +97,8 @@ class Event_Manager(threading.Thread):
         self.broker = None
     
     def _on_broker_msg(self, client, userdata, message):
-        """ Solve received MQTT broker messages.
+        """ Decode received MQTT broker messages and queue them for the render loop.
         """
-        self.callback_guard = True
         topic = message.topic
         msg = message.payload.decode("utf-8")
         logging.debug("Received message %s on topic %s" % (msg,topic))
@@ -97,20 +112,25 @@ class Event_Manager(threading.Thread):
         except:
             payload = msg
             logging.warning('Could not load json from message.')        
-        mode_trigger = self.ui.current_mode.events['broker_message']
-        state_trigger = self.ui.current_mode.current_state.events['broker_message']
-
-        if topic in mode_trigger.keys():
-            if value in mode_trigger[topic].keys():
-                self._resolve_action(mode_trigger[topic][value], payload)
-            elif 'any' in mode_trigger[topic].keys():
-                self._resolve_action(mode_trigger[topic]['any'], payload)
-        elif topic in state_trigger.keys():
-            if value in state_trigger[topic].keys():
-                self._resolve_action(state_trigger[topic][value], payload)
-            elif 'any' in state_trigger[topic].keys():
-                self._resolve_action(state_trigger[topic]['any'], payload)
-        
+        self.queue.post(self._dispatch_broker_msg, topic, value, payload)
+
+    def _dispatch_broker_msg(self, topic, value, payload):
+        """ Solve a received MQTT broker message against the current mode and state (render thread).
+        """
+        self.profiler.start('dispatch')
+        try:
+            mode = self.ui.current_mode
+            handler = self.dispatch.lookup(mode.id, mode.current_state.id, 'broker_message', topic, value)
+            if handler is not None:
+                self._resolve_action(handler, payload)
+        finally:
+            self.profiler.stop('dispatch')
+
+    def process_events(self):
+        """ Apply the events queued by other threads. Called by the render loop once per frame."""
+        if self.queue.process() and self.queue.dropped:
+            logging.debug("Event queue: {}".format(self.queue.stats()))
+
 
     def timer_callback(self, time_left):
         if time_left < 0: 
@@ -120,24 +140,16 @@ class Event_Manager(threading.Thread):
         else:
             print("Le temps alloué a été dépassé de {} minutes".format(time_left))
 
-    def state_callback(self, duration, return_state):
-        self.callback_guard = False
-        time.sleep(duration)
-        if not self.callback_guard:
-            self.ui.set_state(return_state)
-
-
     def touch_input(self, button, value):
         logging.debug('Touch: %s -> %s' % (button, value))
-        mode_trigger = self.ui.current_mode.events['button_clicked']
-        state_trigger = self.ui.current_mode.current_state.events['button_clicked']
-        
-        if button in mode_trigger.keys() and value in mode_trigger[button].keys():
-            actions = mode_trigger[button][value]
-            self._resolve_action(actions)
-        elif button in state_trigger.keys() and value in state_trigger[button].keys():
-            actions = state_trigger[button][value]
-            self._resolve_action(actions)
+        self.profiler.start('dispatch')
+        try:
+            mode = self.ui.current_mode
+            handler = self.dispatch.lookup(mode.id, mode.current_state.id, 'button_clicked', button, value)
+            if handler is not None:
+                self._resolve_action(handler)
+        finally:
+            self.profiler.stop('dispatch')
         
     def publish(self, topic, msg):
         # Format message looking for tokens
@@ -147,74 +159,117 @@ class Event_Manager(threading.Thread):
             logging.debug("Publishing msg %s on topic %s" % (payload, topic))
             self.broker.publish(topic, payload)
 
-    def _resolve_action(self, actions, payload = dict()):
-        if 'connexion' in actions.keys():
-                self.connected = actions['connexion']
+    def compile(self, modes: dict, states: dict):
+        """ Compile the events of modes and states into the dispatch table
+
+        Keyword arguments:
+        modes -- dict mode name -> Mode
+        states -- dict state name -> State
+        """
+        self.dispatch.compile({name: mode.events for name, mode in modes.items()},
+                              {name: state.events for name, state in states.items()},
+                              self._compile_actions)
+        logging.debug("Compiled {} event entries".format(len(self.dispatch)))
+
+    def _compile_actions(self, actions: dict) -> Handler:
+        """ Bind an action dict from a manifest into a Handler.
+        Timeout is performed after the state change it belongs to and play is always performed last."""
+        bound = []
+        for action, value in actions.items():
+            if action in ['connexion', 'timeout', 'play']:
+                continue
+            if action not in self._action_binders.keys():
+                logging.warning("Unknown action {}".format(action))
+                continue
+            bound.append(self._action_binders[action](value))
+        if 'timeout' in actions.keys():
+            bound.append(self._bind_timeout(actions['timeout']))
+        if 'play' in actions.keys():
+            bound.append(self._bind_play(actions['play']))
+        return Handler(bound, actions.get('connexion', None))
+
+    def _resolve_action(self, handler: Handler, payload = dict()):
+        if handler.connexion is not None:
+            self.connected = handler.connexion
         elif not self.connected:
             return
-            #TODO add a map function
-        for action in actions.keys():
-            if action == 'publish' and self.broker is not None: 
-                self.publish(actions["publish"]['topic'],
-                                    actions["publish"]['message'])
-            elif action == 'sound':
-                self.ui.play_sound(actions["sound"])
-            elif action == 'volume':
-                self.change_volume(actions['volume'])
-            elif action == 'volume_set':
-                if "value" in payload.keys():
-                    volume = int(payload["value"])
-                self.set_volume(volume)
-            elif action == 'mode':
-                self.ui.set_mode(actions['mode'])
-            elif action == 'state':
-                self.ui.set_state(actions['state'])
-            elif action == 'timeout':
-                t = threading.Thread(target = self.state_callback, args=(actions['timeout']['duration'], actions['timeout']['return_state'],))
-                t.start()
-            elif action == 'wuw_spotting':
-                #TODO change publish to accept dict and add date
-                self.publish(self.config['wuw_topic'], '{"on":"%(DATE)", "value":"' + self.ui.animations[actions['wuw_spotting']] + '"}')
-            elif action == 'mute':
-                self.mute(actions['mute'])
-        if 'play' in actions.keys(): 
-            self.ui.play_anim(self.ui.animations[actions['play']])
+        for action in handler.actions:
+            action(payload)
+
+    def _bind_publish(self, value):
+        return lambda payload: self.publish(value['topic'], value['message'])
+
+    def _bind_sound(self, value):
+        return lambda payload: self.ui.play_sound(value)
+
+    def _bind_volume(self, value):
+        return lambda payload: self.change_volume(value)
+
+    def _bind_volume_set(self, value):
+        def volume_set(payload):
+            if isinstance(payload, dict) and "value" in payload.keys():
+                self.set_volume(int(payload["value"]))
+        return volume_set
+
+    def _bind_mode(self, value):
+        return lambda payload: self.ui.set_mode(value)
+
+    def _bind_state(self, value):
+        return lambda payload: self.ui.set_state(value)
+
+    def _bind_timeout(self, value):
+        return lambda payload: self.ui.set_timeout(value['duration'], value['return_state'])
+
+    def _bind_wuw_spotting(self, value):
+        #TODO change publish to accept dict and add date
+        return lambda payload: self.publish(self.config['wuw_topic'], '{"on":"%(DATE)", "value":"' + str(value) + '"}')
+
+    def _bind_mute(self, value):
+        return lambda payload: self.mute(value)
+
+    def _bind_play(self, value):
+        return lambda payload: self.ui.play_anim(value)
     
     def change_volume(self, volume):
-        """ The volume value has been changed through the GUI
+        """ The volume value has been changed through the GUI.
+        Changes within volume_debounce seconds are coalesced into the last one.
         """
         try:
             volume = int(volume)
         except:
             logging.warning("Invalid volume value {}".format(volume))
             return
-        if 0 > volume > 100:
+        self._pending_volume = max(0, min(100, volume))
+        if self._volume_timer is None:
+            self._volume_timer = self.ui.timers.call_later(self.volume_debounce, self._apply_volume)
+
+    def _apply_volume(self):
+        self._volume_timer = None
+        volume = self._pending_volume
+        if volume == self.volume:
             return
-        mixer = alsaaudio.Mixer()
-        mixer.setvolume(volume)
+        self.mixer.set_volume(volume)
+        self.volume = volume
         self.publish("ui/volume", '{"on": "%(DATE)", "value":"' + str(volume) + '"}')
 
     def set_volume(self, volume = int):
         """ Change the volume from outside
         """
+        volume = max(0, min(100, volume))
         volume_button = self.ui.buttons['volume_button']
         if volume_button:
-            volume_button = volume_button
             if volume == 0:
-                volume_button.set_state(3)
+                volume_button.set_state(3, notify=False)
             elif 0 < volume <= 30:
-                volume_button.set_state(2)
+                volume_button.set_state(2, notify=False)
             elif 30 < volume <= 60:
-                volume_button.set_state(1)
-            elif 60 < volume:
-                volume_button.set_state(0)
-                if volume > 100:
-                    volume = 100
-            self.change_volume(volume)
+                volume_button.set_state(1, notify=False)
+            else:
+                volume_button.set_state(0, notify=False)
+        self.change_volume(volume)
 
     def get_volume(self):
-        mixer = alsaaudio.Mixer()
-        return mixer.getvolume()[0]       
+        return self.mixer.get_volume()
 
     def mute(self, value):
         mute_button = [button for button in self.ui.buttons_visible if button.id == "mute_button"]
@@ -222,7 +277,7 @@ class Event_Manager(threading.Thread):
             mute_button[0].set_state(value)
 
     def run(self):
-        self.set_volume(self.get_volume())
+        self.queue.post(self.set_volume, self.get_volume())
         while self.alive:
             self.broker = self.broker_connect()
             self.broker.loop_forever(retry_first_connection=True)
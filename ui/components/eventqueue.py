@@ -0,0 +1,59 @@
+import logging
+import threading
+from collections import deque
+
+from ui.components.scheduler import wake
+
+
+class EventQueue:
+    """
+    Bounded queue of calls posted from other threads (MQTT network thread, audio) and applied by the
+    render loop between two frames, so that the UI is only modified from the render thread.
+    Every call is applied, as two identical MQTT messages are two events. When the queue is full the oldest
+    call is dropped, a warning is logged once until the render loop catches up and stats() counts the dropped calls.
+    """
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self.max_depth = 0 # Highest number of pending calls seen
+        self.dropped = 0
+        self.processed = 0
+        self._overflowing = False
+
+    def post(self, function, *args):
+        """ Queue function(*args) to be called by the render loop. Can be called from any thread."""
+        item = (function, args)
+        with self._lock:
+            if len(self._queue) >= self.maxsize:
+                self._queue.popleft()
+                self.dropped += 1
+                if not self._overflowing:
+                    self._overflowing = True
+                    logging.warning("Event queue full, dropping oldest events")
+            self._queue.append(item)
+            self.max_depth = max(self.max_depth, len(self._queue))
+        wake()
+
+    def process(self) -> int:
+        """ Apply the pending calls in order and return how many were applied. Must be called from the render thread."""
+        with self._lock:
+            items = list(self._queue)
+            self._queue.clear()
+            self._overflowing = False
+        for function, args in items:
+            try:
+                function(*args)
+            except Exception:
+                logging.exception("Error while processing event {}{}".format(getattr(function, '__name__', function), args))
+        self.processed += len(items)
+        return len(items)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def stats(self) -> dict:
+        return {'depth': len(self._queue),
+                'max_depth': self.max_depth,
+                'dropped': self.dropped,
+                'processed': self.processed}
@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+
+import pygame as pg
+
+
+class FontRegistry:
+    """
+    Fonts and rendered text shared by the text components.
+    SysFont lookups go through fontconfig and are slow, so each (name, size) font is created once.
+    Rendered strings are kept in a least recently used cache, single characters in a glyph cache
+    used to compose strings that change often (clocks, timers).
+    """
+    def __init__(self, max_strings: int = 128):
+        """ Constructor
+
+        Keyword arguments:
+        max_strings -- number of rendered strings kept
+        """
+        self.max_strings = max_strings
+        self._fonts = dict()
+        self._strings = OrderedDict()
+        self._glyphs = dict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str, size: int) -> pg.font.Font:
+        """ Returns the system font"""
+        key = (name, size)
+        with self._lock:
+            if key not in self._fonts:
+                if not pg.font.get_init():
+                    pg.font.init()
+                self._fonts[key] = pg.font.SysFont(name, size)
+            return self._fonts[key]
+
+    def render(self, name: str, size: int, text: str, color: tuple) -> pg.Surface:
+        """ Returns the antialiased text surface. The surface is shared and must not be modified."""
+        key = (name, size, text, tuple(color))
+        with self._lock:
+            if key in self._strings:
+                self._strings.move_to_end(key)
+                return self._strings[key]
+        surface = self.get(name, size).render(text, True, color)
+        with self._lock:
+            self._strings[key] = surface
+            if len(self._strings) > self.max_strings:
+                self._strings.popitem(last=False)
+        return surface
+
+    def glyph(self, name: str, size: int, char: str, color: tuple) -> pg.Surface:
+        """ Returns the surface of a single character"""
+        key = (name, size, char, tuple(color))
+        surface = self._glyphs.get(key)
+        if surface is None:
+            surface = self._glyphs[key] = self.get(name, size).render(char, True, color)
+        return surface
+
+    def render_glyphs(self, name: str, size: int, text: str, color: tuple) -> pg.Surface:
+        """ Returns a new text surface composed from cached glyphs. Kerning is ignored, meant for digits."""
+        glyphs = [self.glyph(name, size, char, color) for char in text]
+        surface = pg.Surface((sum(g.get_width() for g in glyphs), self.get(name, size).get_height()), pg.SRCALPHA)
+        x = 0
+        for g in glyphs:
+            surface.blit(g, (x, 0))
+            x += g.get_width()
+        return surface
+
+    def clear(self):
+        with self._lock:
+            self._strings.clear()
+            self._glyphs.clear()
+
+fonts = FontRegistry()
@@ -0,0 +1,71 @@
+import pygame as pg
+
+
+class HitMap:
+    """
+    Grid index of the visible buttons used for touch hit-testing, rebuilt when the buttons change.
+    Each grid cell lists the buttons overlapping it, topmost first. A touch returns the topmost button
+    under it. With use_alpha, the transparent outside of a button image (e.g. corners of round buttons)
+    doesn't register: a pixel registers if it lies between the opaque pixels of its row or of its column,
+    so the gaps of line-art icons stay touchable. Buttons without image (Empty_Button) are hit-tested on their rect.
+    """
+    def __init__(self, size: list, cell: int = 32, use_alpha: bool = True):
+        """ Constructor
+
+        Keyword arguments:
+        size -- screen size [width, height]
+        cell -- grid cell size in pixels
+        use_alpha -- ignore the transparent outside of the button images
+        """
+        self.bounds = pg.Rect((0, 0), size)
+        self.cell = cell
+        self.use_alpha = use_alpha
+        self.columns = -(-size[0] // cell)
+        self._cells = [[] for _ in range(self.columns * -(-size[1] // cell))]
+        self._masks = dict() # button -> (image, row spans, column spans)
+
+    def build(self, buttons: list):
+        """ Index the buttons, in drawing order (last one on top)"""
+        self._cells = [[] for _ in self._cells]
+        self._masks = dict()
+        for button in reversed(buttons):
+            rect = pg.Rect(button.rect).clip(self.bounds)
+            if not rect.w or not rect.h:
+                continue
+            for row in range(rect.top // self.cell, (rect.bottom - 1) // self.cell + 1):
+                for column in range(rect.left // self.cell, (rect.right - 1) // self.cell + 1):
+                    self._cells[row * self.columns + column].append(button)
+
+    def hit(self, pos: tuple):
+        """ Returns the topmost button at pos or None"""
+        if not self.bounds.collidepoint(pos):
+            return None
+        for button in self._cells[(pos[1] // self.cell) * self.columns + pos[0] // self.cell]:
+            if button.rect.collidepoint(pos) and self._opaque(button, pos):
+                return button
+        return None
+
+    def _opaque(self, button, pos: tuple) -> bool:
+        image = getattr(button, 'image', None)
+        if not self.use_alpha or image is None or image.get_size() != button.rect.size:
+            return True
+        cached = self._masks.get(button)
+        if cached is None or cached[0] is not image:
+            # Images of state buttons change, shapes are computed on first touch of each image
+            cached = self._masks[button] = (image,) + self._spans(pg.mask.from_surface(image))
+        x, y = pos[0] - button.rect.x, pos[1] - button.rect.y
+        rows, columns = cached[1:]
+        return (rows[y] is not None and rows[y][0] <= x <= rows[y][1]) or \
+               (columns[x] is not None and columns[x][0] <= y <= columns[x][1])
+
+    @staticmethod
+    def _spans(mask: pg.mask.Mask) -> tuple:
+        """ Returns the (first, last) opaque pixel of each row and of each column, None if there is none"""
+        width, height = mask.get_size()
+        rows, columns = [None] * height, [None] * width
+        for y in range(height):
+            for x in range(width):
+                if mask.get_at((x, y)):
+                    rows[y] = (rows[y][0], x) if rows[y] is not None else (x, x)
+                    columns[x] = (columns[x][0], y) if columns[x] is not None else (y, y)
+        return rows, columns
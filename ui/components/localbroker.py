@@ -0,0 +1,64 @@
+import queue
+
+import paho.mqtt.client as mqtt
+
+
+class LocalMessage:
+    """ Message delivered by the LocalBroker, with the attributes of a paho MQTTMessage used by the UI"""
+    __slots__ = ('topic', 'payload')
+
+    def __init__(self, topic: str, payload: bytes):
+        self.topic = topic
+        self.payload = payload
+
+
+class LocalBroker:
+    """
+    In-process stand-in for the paho MQTT client, used in headless mode.
+    Messages published by the UI or injected with inject() are delivered to on_message
+    when their topic matches a subscription. Messages are delivered from the loop_forever thread,
+    as paho does.
+    """
+    def __init__(self):
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+        self.subscriptions = set()
+        self.published = [] # (topic, payload) published by the UI
+        self._messages = queue.Queue()
+        self._connected = False
+
+    def connect(self, host: str, port: int = 1883, keepalive: int = 60):
+        self._connected = True
+
+    def subscribe(self, topic, qos: int = 0):
+        """ Subscribe to a topic or to a list of (topic, qos)"""
+        topics = topic if isinstance(topic, list) else [(topic, qos)]
+        self.subscriptions.update(t for t, _ in topics)
+
+    def publish(self, topic: str, payload = None, qos: int = 0, retain: bool = False):
+        self.published.append((topic, payload))
+        self.inject(topic, payload)
+
+    def inject(self, topic: str, payload = None):
+        """ Deliver a message as if it came from the broker. Can be called from any thread."""
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        self._messages.put(LocalMessage(topic, payload if payload is not None else b''))
+
+    def disconnect(self):
+        self._messages.put(None)
+
+    def loop_forever(self, retry_first_connection: bool = False):
+        """ Deliver messages until disconnect() is called"""
+        if self.on_connect is not None:
+            self.on_connect(self, None, {}, 0)
+        while True:
+            message = self._messages.get()
+            if message is None:
+                break
+            if self.on_message is not None and any(mqtt.topic_matches_sub(sub, message.topic) for sub in self.subscriptions):
+                self.on_message(self, None, message)
+        self._connected = False
+        if self.on_disconnect is not None:
+            self.on_disconnect(self, None, 0)
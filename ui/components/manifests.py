@@ -0,0 +1,353 @@
+import json
+import logging
+import os
+import pickle
+import threading
+
+from ui.components import ROOT_PATH
+
+# Schema of the manifests of each folder: key -> (accepted types, required)
+NUMBER = (int, float)
+SCHEMAS = {
+    'animations': {'id': (str, True), 'type': (str, True), 'sprites': (dict, True), 'duration': (int, False)},
+    'states': {'state_name': (str, True), 'animation': (str, True), 'buttons': (list, True),
+               'wuw_spotting': (bool, True), 'events': (dict, True)},
+    'modes': {'mode_name': (str, True), 'default_state': (str, True), 'events': (dict, True), 'fps': (int, False)},
+    'buttons': {'name': (str, True), 'type': (str, True), 'rect': (list, True), 'nb_frames': (int, False),
+                'frame_width': (int, False), 'frame_duration': (int, False), 'state_values': (list, False)},
+    'sprites': {'name': (str, False), 'nb_frames': (int, True), 'frame_width': (int, True), 'frame_duration': (int, False)},
+}
+ANIMATION_TYPES = ['state', 'timed']
+SPRITE_MODES = ['static', 'bouncing', 'animated', 'none']
+BUTTON_TYPES = ['single', 'state', 'animated', 'switch', 'animated_switch', 'void']
+EVENT_TYPES = ['broker_message', 'button_clicked']
+# Event actions and the type of their value
+ACTIONS = {'publish': dict, 'sound': str, 'volume': (str, int), 'volume_set': str, 'mode': str, 'state': str,
+           'timeout': dict, 'wuw_spotting': (bool, str), 'mute': bool, 'play': str, 'connexion': bool}
+FOLDERS = ['animations', 'states', 'modes', 'buttons']
+BUNDLE_VERSION = 1
+
+
+class ManifestError(Exception):
+    """ Raised when a manifest can't be read or misses a required key"""
+    pass
+
+
+def _type_names(types) -> str:
+    return " or ".join(t.__name__ for t in (types if isinstance(types, tuple) else (types,)))
+
+
+class ManifestCompiler:
+    """
+    Reads the whole manifest tree of the ui folder, checks each manifest against SCHEMAS and resolves
+    the references between them: state -> animation and buttons, mode -> default state,
+    events -> states, modes, animations, buttons and sounds, animation -> placeholders and sprites.
+    Every error is collected, so a single run reports all of them.
+    """
+    def __init__(self, root: str = ROOT_PATH):
+        self.root = root
+        self.errors = []
+        self.manifests = dict() # path relative to root -> manifest
+        self.sources = dict() # path relative to root -> mtime in ns, for files and folders read
+
+    def compile(self) -> dict:
+        """ Returns the bundle of the manifest tree, raises ManifestError listing every error found"""
+        placeholders = self._read('placeholders.json')
+        if not isinstance(placeholders, dict) or not isinstance(placeholders.get('placeholders'), dict) \
+                or not isinstance(placeholders.get('draw_order'), list):
+            self._error('placeholders.json', "should define 'placeholders' and 'draw_order'")
+            placeholders = {'placeholders': {}, 'draw_order': []}
+        folders = {folder: self._read_folder(folder, folder) for folder in FOLDERS}
+        sheets = self._read_folder('sprites', 'sprites')
+        self._track('sounds')
+        names = {
+            'animations': self._names('animations', 'id'),
+            'states': self._names('states', 'state_name'),
+            'modes': self._names('modes', 'mode_name'),
+            'buttons': self._names('buttons', 'name'),
+            'sounds': {file_name[:-4] for file_name in self._listdir('sounds') if file_name.endswith('.wav')},
+        }
+        for path, manifest in folders['animations'].items():
+            self._check_animation(path, manifest, placeholders['placeholders'], sheets)
+        for path, manifest in folders['buttons'].items():
+            self._check_button(path, manifest)
+        topics = set()
+        for path, manifest in folders['states'].items():
+            self._check_ref(path, 'animation', manifest['animation'], names['animations'])
+            for button in manifest['buttons']:
+                self._check_ref(path, 'button', button, names['buttons'])
+            topics.update(self._check_events(path, manifest['events'], names))
+        for path, manifest in folders['modes'].items():
+            self._check_ref(path, 'default_state', manifest['default_state'], names['states'])
+            topics.update(self._check_events(path, manifest['events'], names))
+        if self.errors:
+            raise ManifestError("{} manifest errors:\n  {}".format(len(self.errors), "\n  ".join(self.errors)))
+        return {'version': BUNDLE_VERSION,
+                'root': self.root,
+                'sources': self.sources,
+                'manifests': self.manifests,
+                'folders': {folder: list(manifests.keys()) for folder, manifests in folders.items()},
+                'topics': sorted(topics)}
+
+    def _error(self, path: str, message: str):
+        self.errors.append("{}: {}".format(path, message))
+
+    def _track(self, path: str):
+        try:
+            self.sources[path] = os.stat(os.path.join(self.root, path)).st_mtime_ns
+        except OSError as e:
+            self._error(path, e.strerror)
+
+    def _listdir(self, folder: str) -> list:
+        try:
+            return sorted(os.listdir(os.path.join(self.root, folder)))
+        except OSError:
+            return []
+
+    def _read(self, path: str):
+        self._track(path)
+        try:
+            with open(os.path.join(self.root, path), 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            self._error(path, "could not be read: {}".format(e))
+            return None
+        self.manifests[path] = manifest
+        return manifest
+
+    def _read_folder(self, folder: str, kind: str) -> dict:
+        """ Returns a dict path -> manifest of the .json files of folder matching the schema"""
+        self._track(folder)
+        manifests = dict()
+        for file_name in self._listdir(folder):
+            if file_name.endswith('.json'):
+                path = os.path.join(folder, file_name)
+                manifest = self._read(path)
+                if manifest is not None and self._check_schema(kind, path, manifest):
+                    manifests[path] = manifest
+        return manifests
+
+    def _check_schema(self, kind: str, path: str, manifest) -> bool:
+        if not isinstance(manifest, dict):
+            self._error(path, "should be a json object")
+            return False
+        valid = True
+        for key, (types, required) in SCHEMAS[kind].items():
+            if key not in manifest.keys():
+                if required:
+                    self._error(path, "missing the '{}' key".format(key))
+                    valid = False
+            elif not isinstance(manifest[key], types):
+                self._error(path, "'{}' should be {}".format(key, _type_names(types)))
+                valid = False
+        return valid
+
+    def _names(self, folder: str, key: str) -> set:
+        """ Returns the names defined in folder, including by manifests with schema errors"""
+        names = dict()
+        for path, manifest in self.manifests.items():
+            if os.path.dirname(path) != folder or not isinstance(manifest, dict) or key not in manifest.keys():
+                continue
+            if manifest[key] in names:
+                self._error(path, "{} '{}' already defined in {}".format(key, manifest[key], names[manifest[key]]))
+            names[manifest[key]] = path
+        return set(names)
+
+    def _check_ref(self, path: str, kind: str, name, names: set):
+        if name not in names:
+            self._error(path, "unknown {} '{}'".format(kind, name))
+
+    def _check_animation(self, path: str, manifest: dict, placeholders: dict, sheets: dict):
+        if manifest['type'] not in ANIMATION_TYPES:
+            self._error(path, "unknown animation type '{}'".format(manifest['type']))
+        elif manifest['type'] == 'timed' and 'duration' not in manifest.keys():
+            self._error(path, "timed animation without 'duration'")
+        for placeholder, sprite in manifest['sprites'].items():
+            self._check_ref(path, 'placeholder', placeholder, placeholders)
+            if not isinstance(sprite, dict) or sprite.get('mode') not in SPRITE_MODES + [None, 'None']:
+                self._error(path, "sprite '{}' should have a mode among {}".format(placeholder, ", ".join(SPRITE_MODES)))
+                continue
+            if sprite['mode'] in [None, 'none', 'None']:
+                continue
+            sprite_path = os.path.join('sprites', str(sprite.get('sprite_name')))
+            if not os.path.isfile(os.path.join(self.root, sprite_path + '.png')):
+                self._error(path, "sprite image {}.png not found".format(sprite_path))
+            if sprite['mode'] == 'animated' and sprite_path + '.json' not in sheets:
+                self._error(path, "sprite sheet manifest {}.json not found".format(sprite_path))
+
+    def _check_button(self, path: str, manifest: dict):
+        if manifest['type'] not in BUTTON_TYPES:
+            self._error(path, "unknown button type '{}'".format(manifest['type']))
+        if len(manifest['rect']) != 4 or not all(isinstance(v, NUMBER) for v in manifest['rect']):
+            self._error(path, "'rect' should be 4 numbers")
+        if manifest['type'] == 'void':
+            return
+        for key in ['nb_frames', 'frame_width']:
+            if key not in manifest.keys():
+                self._error(path, "missing the '{}' key".format(key))
+        if not os.path.isfile(os.path.join(self.root, path[:-len('.json')] + '.png')):
+            self._error(path, "button image not found")
+
+    def _check_events(self, path: str, events: dict, names: dict) -> set:
+        """ Check the events of a mode or state. Returns the broker topics they subscribe to."""
+        for event_type, triggers in events.items():
+            if event_type not in EVENT_TYPES:
+                self._error(path, "unknown event type '{}'".format(event_type))
+                continue
+            if not isinstance(triggers, dict):
+                self._error(path, "'{}' should be dict".format(event_type))
+                continue
+            for trigger, values in triggers.items():
+                if event_type == 'button_clicked':
+                    self._check_ref(path, 'button', trigger, names['buttons'])
+                if not isinstance(values, dict) or not all(isinstance(actions, dict) for actions in values.values()):
+                    self._error(path, "{} '{}' should map values to actions".format(event_type, trigger))
+                    continue
+                for actions in values.values():
+                    self._check_actions("{} ({} {})".format(path, event_type, trigger), actions, names)
+        return set(events.get('broker_message', {}).keys())
+
+    def _check_actions(self, path: str, actions: dict, names: dict):
+        for action, value in actions.items():
+            if action not in ACTIONS.keys():
+                self._error(path, "unknown action '{}'".format(action))
+            elif not isinstance(value, ACTIONS[action]):
+                self._error(path, "'{}' should be {}".format(action, _type_names(ACTIONS[action])))
+            elif action == 'state':
+                self._check_ref(path, 'state', value, names['states'])
+            elif action == 'mode':
+                self._check_ref(path, 'mode', value, names['modes'] | {'last'})
+            elif action == 'play':
+                self._check_ref(path, 'animation', value, names['animations'])
+            elif action == 'sound':
+                self._check_ref(path, 'sound', value, names['sounds'])
+            elif action == 'timeout':
+                if not isinstance(value.get('duration'), NUMBER):
+                    self._error(path, "timeout 'duration' should be a number")
+                self._check_ref(path, 'state', value.get('return_state'), names['states'])
+            elif action == 'publish':
+                if not isinstance(value.get('topic'), str) or not isinstance(value.get('message'), str):
+                    self._error(path, "publish should have a 'topic' and a 'message'")
+
+
+class ManifestRepository:
+    """
+    Single place where the json manifests of the ui folder are read. Each file is parsed once and
+    the parsed manifest is shared by every component that needs it. Manifests of the animations, states,
+    modes and buttons folders are checked for their required keys when the folder is read.
+    After load, the whole tree comes from the compiled bundle and no json file is opened.
+    """
+    def __init__(self, root: str = ROOT_PATH):
+        self.root = root
+        self._manifests = dict() # file path -> manifest
+        self._folders = dict() # folder path -> {file path: manifest}
+        self._topics = None
+        self._lock = threading.RLock()
+
+    def load(self, bundle_path: str = None):
+        """ Load the whole manifest tree from the bundle in a single read. The tree is compiled, and the
+        bundle written, when the bundle is missing or a source file changed since it was compiled.
+        Raises ManifestError if the tree doesn't compile.
+
+        Keyword arguments:
+        bundle_path -- the bundle file, None to compile without writing a bundle
+        """
+        bundle = self._read_bundle(bundle_path) if bundle_path else None
+        if bundle is None:
+            bundle = ManifestCompiler(self.root).compile()
+            logging.debug("Compiled {} manifests".format(len(bundle['manifests'])))
+            if bundle_path:
+                self._write_bundle(bundle_path, bundle)
+        with self._lock:
+            self._manifests = {os.path.join(self.root, path): manifest for path, manifest in bundle['manifests'].items()}
+            self._folders = {os.path.join(self.root, folder): {os.path.join(self.root, path): bundle['manifests'][path] for path in paths}
+                             for folder, paths in bundle['folders'].items()}
+            self._topics = bundle['topics']
+
+    def snapshot(self) -> dict:
+        """ Returns a dict file path -> manifest of the loaded manifests"""
+        with self._lock:
+            return dict(self._manifests)
+
+    def _read_bundle(self, bundle_path: str) -> dict:
+        """ Returns the bundle if it is up to date, None otherwise"""
+        try:
+            with open(bundle_path, 'rb') as f:
+                bundle = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            return None
+        if not isinstance(bundle, dict) or bundle.get('version') != BUNDLE_VERSION or bundle.get('root') != self.root:
+            return None
+        for path, mtime in bundle['sources'].items():
+            try:
+                if os.stat(os.path.join(self.root, path)).st_mtime_ns != mtime:
+                    logging.debug("Manifest bundle outdated by {}".format(path))
+                    return None
+            except OSError:
+                return None
+        return bundle
+
+    @staticmethod
+    def _write_bundle(bundle_path: str, bundle: dict):
+        try:
+            os.makedirs(os.path.dirname(bundle_path) or '.', exist_ok=True)
+            tmp_path = "{}.{}.tmp".format(bundle_path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(bundle, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, bundle_path)
+        except OSError as e:
+            logging.warning("Could not write manifest bundle {}: {}".format(bundle_path, e))
+
+    def get(self, path: str) -> dict:
+        """ Returns the parsed json file"""
+        path = os.path.normpath(os.path.join(self.root, path))
+        with self._lock:
+            if path not in self._manifests:
+                try:
+                    with open(path, 'r') as f:
+                        self._manifests[path] = json.load(f)
+                except (OSError, ValueError) as e:
+                    raise ManifestError("Could not load manifest {}: {}".format(path, e))
+            return self._manifests[path]
+
+    def folder(self, folder: str) -> dict:
+        """ Returns a dict file path -> manifest of the .json files in folder
+
+        Keyword arguments:
+        folder -- a folder path, relative to the ui folder or absolute
+        """
+        folder = os.path.normpath(os.path.join(self.root, folder))
+        with self._lock:
+            if folder not in self._folders:
+                manifests = dict()
+                for file_name in sorted(os.listdir(folder)):
+                    if file_name.endswith('.json'):
+                        file_path = os.path.join(folder, file_name)
+                        manifests[file_path] = self._validate(os.path.basename(folder), file_path, self.get(file_path))
+                self._folders[folder] = manifests
+            return self._folders[folder]
+
+    @staticmethod
+    def _validate(kind: str, path: str, manifest: dict) -> dict:
+        for key, (_, required) in SCHEMAS.get(kind, {}).items():
+            if required and (not isinstance(manifest, dict) or key not in manifest.keys()):
+                raise ManifestError("Manifest {} is missing the '{}' key".format(path, key))
+        return manifest
+
+    @property
+    def placeholders(self) -> dict:
+        return self.get('placeholders.json')
+
+    @property
+    def topics(self) -> list:
+        """ Topics of every broker_message event of the modes and states"""
+        with self._lock:
+            if self._topics is None:
+                topics = set()
+                for folder in ['modes', 'states']:
+                    for manifest in self.folder(folder).values():
+                        topics.update(manifest['events'].get('broker_message', {}).keys())
+                self._topics = sorted(topics)
+            return self._topics
+
+manifests = ManifestRepository()
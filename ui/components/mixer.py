@@ -0,0 +1,55 @@
+import logging
+
+try:
+    import alsaaudio
+except ImportError:
+    alsaaudio = None
+
+
+class NullMixer:
+    """ Mixer keeping the volume in memory. Used when no sound card is available or as a test stub."""
+    def __init__(self, volume: int = 50):
+        self.volume = volume
+
+    def get_volume(self) -> int:
+        return self.volume
+
+    def set_volume(self, volume: int):
+        self.volume = volume
+
+
+class AlsaMixer:
+    """ ALSA mixer control opened once and kept for the lifetime of the UI"""
+    def __init__(self, control: str = 'Master'):
+        self.control = control
+        self._mixer = None
+
+    @property
+    def mixer(self) -> "alsaaudio.Mixer":
+        if self._mixer is None:
+            self._mixer = alsaaudio.Mixer(self.control)
+        return self._mixer
+
+    def get_volume(self) -> int:
+        try:
+            return self.mixer.getvolume()[0]
+        except alsaaudio.ALSAAudioError:
+            # The handle may be stale (e.g. sound card reset), reopen it once
+            self._mixer = None
+            return self.mixer.getvolume()[0]
+
+    def set_volume(self, volume: int):
+        try:
+            self.mixer.setvolume(volume)
+        except alsaaudio.ALSAAudioError:
+            logging.warning("Could not set volume, reopening mixer {}".format(self.control))
+            self._mixer = None
+            self.mixer.setvolume(volume)
+
+
+def default_mixer():
+    """ Returns an AlsaMixer, or a NullMixer when alsaaudio is not installed"""
+    if alsaaudio is None:
+        logging.warning("alsaaudio is not installed, volume changes won't be applied")
+        return NullMixer()
+    return AlsaMixer()
@@ -0,0 +1,64 @@
+import time
+
+REFERENCE_FPS = 30 # Frame rate the sprite speeds (pixels per frame) are given for
+TABLE_RATE = 1000 # Motion table samples per second
+
+# Clock the motions are sampled from. All sprites read the same clock, so sprites with the same
+# amplitude and speed move in phase, and keep their phase when the animation changes.
+clock = time.monotonic
+
+
+class MotionTable:
+    """
+    Integer offsets of an up and down motion over one period, sampled TABLE_RATE times per second.
+    For each sample, the table also holds the number of samples before the offset changes,
+    which tells when the sprite will actually move.
+    """
+    def __init__(self, amplitude: int, speed: float):
+        """ Constructor
+
+        Keyword arguments:
+        amplitude -- number of pixels to move up and down
+        speed -- number of pixels to move at each frame at REFERENCE_FPS
+        """
+        self.amplitude = amplitude
+        self.speed = speed
+        period = 4 * amplitude / (speed * REFERENCE_FPS)
+        self.size = max(1, round(period * TABLE_RATE))
+        self.offsets = []
+        for i in range(self.size):
+            phase = i / self.size
+            if phase < 0.25:
+                offset = 4 * amplitude * phase
+            elif phase < 0.75:
+                offset = 2 * amplitude - 4 * amplitude * phase
+            else:
+                offset = 4 * amplitude * phase - 4 * amplitude
+            self.offsets.append(round(offset))
+        # Samples before the next offset change, the table wraps around
+        self.changes = [self.size] * self.size
+        for _ in range(2):
+            for i in reversed(range(self.size)):
+                following = (i + 1) % self.size
+                if self.offsets[following] != self.offsets[i]:
+                    self.changes[i] = 1
+                else:
+                    self.changes[i] = min(self.size, self.changes[following] + 1)
+
+    def offset(self, t: float) -> int:
+        """ Returns the offset in pixels at time t"""
+        return self.offsets[int(t * TABLE_RATE) % self.size]
+
+    def next_change(self, t: float) -> float:
+        """ Returns the time in seconds from t until the offset changes"""
+        sample = t * TABLE_RATE
+        return (self.changes[int(sample) % self.size] - sample % 1) / TABLE_RATE
+
+_tables = dict()
+
+def motion_table(amplitude: int, speed: float) -> MotionTable:
+    """ Returns the shared motion table for amplitude and speed"""
+    key = (amplitude, speed)
+    if key not in _tables:
+        _tables[key] = MotionTable(amplitude, speed)
+    return _tables[key]
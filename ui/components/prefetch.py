@@ -0,0 +1,109 @@
+import logging
+import queue
+import threading
+
+
+class Prefetcher(threading.Thread):
+    """
+    Prefetcher builds, on a worker thread, the animations that can be displayed within a few transitions
+    from the current mode and state so that the render loop does not have to build them on a state change.
+    Transitions are read from the events of the mode and state manifests (state, mode, play and timeout actions).
+    """
+    def __init__(self, ui: "UI class", depth: int = 2):
+        """ Constructor
+
+        Keyword arguments:
+        ui -- the UI holding the modes, states and animation registry
+        depth -- number of transitions to look ahead
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.ui = ui
+        self.depth = depth
+        self.requests = queue.Queue()
+        self.alive = True
+        self.predicted = set()
+        self.hits = 0 # Predicted animations that were built when displayed
+        self.misses = 0 # Predicted animations that were not built yet when displayed
+        self.unpredicted = 0 # Displayed animations that were not predicted
+
+    def prefetch(self, mode, state):
+        """ Queue the animations reachable from mode and state for building"""
+        if self.depth < 1 or mode is None or state is None:
+            return
+        names = self.reachable(mode, state)
+        self.predicted = set(names)
+        self.requests.put(names)
+
+    def record(self, name: str):
+        """ Update the prediction counters for an animation about to be displayed"""
+        if name not in self.predicted:
+            self.unpredicted += 1
+        elif self.ui.animations.is_built(name):
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'unpredicted': self.unpredicted}
+
+    def reachable(self, mode, state) -> list:
+        """ Returns the names of the animations reachable from mode and state, nearest first"""
+        animations = []
+        visited = {(mode.id, state.id)}
+        frontier = [(mode, state)]
+        for _ in range(self.depth):
+            next_frontier = []
+            for mode, state in frontier:
+                for target_mode, target_state, animation in self._transitions(mode, state):
+                    if animation is not None and animation not in animations:
+                        animations.append(animation)
+                    if target_state is not None and (target_mode.id, target_state.id) not in visited:
+                        visited.add((target_mode.id, target_state.id))
+                        next_frontier.append((target_mode, target_state))
+            frontier = next_frontier
+        return animations
+
+    def _transitions(self, mode, state):
+        """ Yields (mode, state, animation) for every action of the mode and state events"""
+        for events in [state.events, mode.events]:
+            for triggers in events.values():
+                for values in triggers.values():
+                    for actions in values.values():
+                        yield from self._targets(mode, state, actions)
+
+    def _targets(self, mode, state, actions: dict):
+        if 'play' in actions.keys():
+            yield mode, None, actions['play']
+        if 'mode' in actions.keys():
+            if actions['mode'] == 'last':
+                target = mode.previous_mode
+            else:
+                target = self.ui.modes.get(actions['mode'], None)
+            if target is not None:
+                target_state = target.default_state if target.default_state is not None else state
+                yield target, target_state, target_state.animation
+        for target_name in [actions.get('state', None), actions.get('timeout', {}).get('return_state', None)]:
+            target_state = self.ui.states.get(target_name, None)
+            if target_state is not None:
+                yield mode, target_state, target_state.animation
+
+    def stop(self):
+        """ Stop the worker once the animation being built, if any, is done"""
+        self.alive = False
+        self.requests.put(None)
+
+    def run(self):
+        registry = self.ui.animations
+        while self.alive:
+            names = self.requests.get()
+            # Only the latest prediction matters
+            while names is not None and not self.requests.empty():
+                names = self.requests.get_nowait()
+            if names is None:
+                break
+            for name in names:
+                if not self.alive or not self.requests.empty() or not registry.has_room():
+                    break
+                if name in registry and not registry.is_built(name):
+                    logging.debug("Prefetching animation {}".format(name))
+                    registry.get(name)
@@ -0,0 +1,104 @@
+import time
+from collections import deque
+
+from ui.components.scheduler import seconds_to_frames
+from ui.components.texts import TextBox
+
+
+class NullProfiler:
+    """ Profiler used when profiling is switched off: every call does nothing"""
+    enabled = False
+
+    def start(self, section: str):
+        pass
+
+    def stop(self, section: str):
+        pass
+
+    def end_frame(self):
+        pass
+
+null_profiler = NullProfiler()
+
+
+class Profiler:
+    """
+    Per frame timings of the main loop sections, kept in ring buffers of the last size frames.
+    A section can be started and stopped several times in a frame, its durations add up.
+    Switched off, the NullProfiler is used instead and instrumentation costs one empty method call.
+    """
+    enabled = True
+
+    def __init__(self, size: int = 300):
+        """ Constructor
+
+        Keyword arguments:
+        size -- number of frames kept
+        """
+        self.size = size
+        self.sections = dict() # section -> deque of durations in seconds
+        self.frame_times = deque(maxlen=size)
+        self._current = dict()
+        self._starts = dict()
+
+    def start(self, section: str):
+        start, depth = self._starts.get(section, (None, 0))
+        # Nested calls (e.g. a dispatch triggering another one) are counted once
+        self._starts[section] = (time.perf_counter() if depth == 0 else start, depth + 1)
+
+    def stop(self, section: str):
+        start, depth = self._starts[section]
+        if depth == 1:
+            self._current[section] = self._current.get(section, 0) + time.perf_counter() - start
+        self._starts[section] = (start, depth - 1)
+
+    def end_frame(self):
+        """ Push the timings of the frame to the ring buffers"""
+        for section in self._current:
+            if section not in self.sections:
+                self.sections[section] = deque([0] * len(self.frame_times), maxlen=self.size)
+        for section, durations in self.sections.items():
+            durations.append(self._current.get(section, 0))
+        self._current = dict()
+        self.frame_times.append(time.perf_counter())
+
+    @property
+    def fps(self) -> float:
+        if len(self.frame_times) < 2:
+            return 0
+        return (len(self.frame_times) - 1) / (self.frame_times[-1] - self.frame_times[0])
+
+    def stats(self) -> dict:
+        """ Returns the mean and max duration in ms of each section over the buffered frames"""
+        stats = dict()
+        for section, durations in self.sections.items():
+            if durations:
+                stats[section] = {'mean': sum(durations) * 1000 / len(durations),
+                                  'max': max(durations) * 1000}
+        return stats
+
+
+class ProfilerOverlay(TextBox):
+    """ Mean time per frame of each profiled section, refreshed once a second"""
+    font_size = 20
+    color = (75,75,75)
+    sections = ['update', 'render', 'display', 'inputs', 'events', 'dispatch']
+
+    def __init__(self, profiler: Profiler, pos):
+        self.profiler = profiler
+        self._second = int(time.time())
+        super().__init__(self._format(), pos)
+
+    def _format(self) -> str:
+        stats = self.profiler.stats()
+        timings = ["{} {:.2f}".format(section, stats[section]['mean']) for section in self.sections if section in stats]
+        return "{:.0f} fps | {} ms".format(self.profiler.fps, " ".join(timings))
+
+    def update(self, ticks: int = 1):
+        second = int(time.time())
+        if second != self._second:
+            self._second = second
+            self.set_text(self._format())
+
+    def next_change(self, frame_period: float) -> int:
+        return seconds_to_frames(1 - time.time() % 1, frame_period)
@@ -0,0 +1,142 @@
+import pygame as pg
+
+from ui.components.profiler import null_profiler
+
+
+def merge_rects(rects: list, bounds: pg.Rect = None) -> list:
+    """ Returns a list of non overlapping rects covering the given rects.
+    Overlapping rects are replaced by their union, empty rects are dropped.
+
+    Keyword arguments:
+    rects -- a list of rects
+    bounds -- if set, rects are clipped to it
+    """
+    merged = []
+    for rect in rects:
+        rect = pg.Rect(rect)
+        if bounds is not None:
+            rect = rect.clip(bounds)
+        if not rect.w or not rect.h:
+            continue
+        i = 0
+        while i < len(merged):
+            if merged[i].colliderect(rect):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
+
+class Renderer:
+    """
+    Dirty rectangle renderer. It keeps track of where each sprite was drawn and only
+    clears, redraws and pushes to the display the areas that changed since the last frame.
+    A sprite area is dirty when its updated flag is set, or its rect or image changed.
+    A sprite that redraws part of its image in place can set dirty_rect (relative to the sprite)
+    along with updated to only refresh that part.
+
+    The leading static sprites of the first group (e.g. the body of an animation) are flattened with
+    the background into a composite surface on each full update, so that only the moving sprites are
+    blitted afterwards. The composite is rebuilt when those static sprites change.
+    """
+    def __init__(self, screen: pg.Surface, background: pg.Surface):
+        self.screen = screen
+        self.background = background
+        self.full_update = True
+        self._drawn = dict() # sprite -> (rect, image) as last drawn
+        self._composite = background
+        self._static = [] # (sprite, rect, image) flattened in the composite
+        self.profiler = null_profiler
+
+    def invalidate(self):
+        """ Redraw and update the whole screen on next frame"""
+        self.full_update = True
+
+    def render(self, groups: list) -> list:
+        """ Draw the sprite groups in order and update the display. Returns the updated rects.
+
+        Keyword arguments:
+        groups -- the sprite groups to draw, from bottom to top
+        """
+        sprites = [sprite for group in groups for sprite in group.sprites()]
+        screen_rect = self.screen.get_rect()
+        if not self.full_update and self._static and not self._composite_valid(sprites):
+            self.full_update = True
+        if self.full_update:
+            self.full_update = False
+            self._build_composite(groups[0].sprites() if groups else [])
+            self.screen.blit(self._composite, [0,0])
+            sprites = sprites[len(self._static):]
+            for sprite in sprites:
+                self.screen.blit(sprite.image, sprite.rect)
+            self._snapshot(sprites)
+            self.profiler.start('display')
+            pg.display.update()
+            self.profiler.stop('display')
+            return [screen_rect]
+
+        sprites = sprites[len(self._static):]
+        dirty = []
+        drawn = self._drawn
+        for sprite in sprites:
+            last = drawn.pop(sprite, None)
+            if last is None:
+                dirty.append(sprite.rect)
+            elif last[1] is not sprite.image or last[0] != sprite.rect:
+                dirty.append(last[0])
+                dirty.append(sprite.rect)
+            elif getattr(sprite, 'updated', False):
+                local = getattr(sprite, 'dirty_rect', None)
+                dirty.append(sprite.rect if local is None else local.move(sprite.rect.topleft))
+        # Sprites that are no longer displayed
+        dirty.extend(rect for rect, _ in drawn.values())
+
+        dirty = merge_rects(dirty, screen_rect)
+        if dirty:
+            for rect in dirty:
+                self.screen.blit(self._composite, rect, area=rect)
+            for sprite in sprites:
+                for rect in dirty:
+                    area = sprite.rect.clip(rect)
+                    if area.w and area.h:
+                        self.screen.blit(sprite.image, area, area=area.move(-sprite.rect.x, -sprite.rect.y))
+            self.profiler.start('display')
+            pg.display.update(dirty)
+            self.profiler.stop('display')
+        self._snapshot(sprites)
+        return dirty
+
+    def _build_composite(self, sprites: list):
+        """ Flatten the leading static sprites with the background"""
+        self._static = []
+        for sprite in sprites:
+            if not getattr(sprite, 'static', False):
+                break
+            self._static.append((sprite, sprite.rect.copy(), sprite.image))
+            sprite.updated = False
+        if not self._static:
+            self._composite = self.background
+            return
+        if self._composite is self.background:
+            self._composite = self.background.copy()
+        else:
+            self._composite.blit(self.background, [0,0])
+        for sprite, rect, image in self._static:
+            self._composite.blit(image, rect)
+
+    def _composite_valid(self, sprites: list) -> bool:
+        """ Checks that the flattened sprites are still displayed first and unchanged"""
+        if len(sprites) < len(self._static):
+            return False
+        for (sprite, rect, image), displayed in zip(self._static, sprites):
+            if sprite is not displayed or sprite.updated or sprite.image is not image or sprite.rect != rect:
+                return False
+        return True
+
+    def _snapshot(self, sprites: list):
+        self._drawn = dict()
+        for sprite in sprites:
+            self._drawn[sprite] = (sprite.rect.copy(), sprite.image)
+            sprite.updated = False
@@ -0,0 +1,88 @@
+import math
+import time
+
+import pygame as pg
+
+WAKE_EVENT = pg.USEREVENT + 1
+
+def wake():
+    """ Wake up the render loop. Can be called from any thread."""
+    if pg.display.get_init():
+        pg.event.post(pg.event.Event(WAKE_EVENT))
+
+
+def seconds_to_frames(seconds: float, frame_period: float) -> int:
+    """ Returns the number of frames to wait so that at least seconds have passed"""
+    return max(1, math.ceil(seconds / frame_period))
+
+
+class FrameScheduler:
+    """
+    Paces the render loop. Instead of ticking at a fixed rate it sleeps until the next frame
+    on which a sprite will visibly change, or until an input event (or wake()) arrives.
+
+    Sprites tell when they will change through a next_change(frame_period) method returning the
+    number of frames before the change, or None if they will not change on their own. Sprites
+    without that method are assumed to change every frame.
+    """
+    def __init__(self, fps: int = 30, max_idle: float = 1.0):
+        """ Constructor
+
+        Keyword arguments:
+        fps -- maximum frame rate
+        max_idle -- maximum time in seconds spent waiting when nothing is scheduled
+        """
+        self.frame = 0 # Frame counter since start
+        self.origin = time.monotonic()
+        self.max_idle = max_idle
+        self.set_fps(fps)
+
+    def set_fps(self, fps: int):
+        """ Change the frame rate, the frame counter keeps running."""
+        self.fps = fps
+        self.frame_period = 1 / fps
+        self.origin = time.monotonic() - self.frame * self.frame_period
+
+    def next_change(self, groups: list) -> int:
+        """ Returns the number of frames before the next visible change in the sprite groups or None.
+        Groups can define next_change as well (e.g. timed animations).
+        """
+        frames = None
+        for group in groups:
+            group_change = getattr(group, 'next_change', None)
+            changes = [group_change] if group_change is not None else []
+            changes += [getattr(sprite, 'next_change', None) for sprite in group.sprites()]
+            for next_change in changes:
+                n = next_change(self.frame_period) if next_change is not None else 1
+                if n is not None and (frames is None or n < frames):
+                    if n <= 1:
+                        return 1
+                    frames = n
+        return frames
+
+    def wait(self, groups: list, timer_deadline: float = None) -> tuple:
+        """ Sleep until the next frame due, returns the number of frames elapsed and the received events.
+
+        Keyword arguments:
+        groups -- the displayed sprite groups
+        timer_deadline -- time.monotonic() value of the next timer to run, wakes up earlier if needed
+        """
+        max_frames = seconds_to_frames(self.max_idle, self.frame_period)
+        frames = self.next_change(groups)
+        frames = max_frames if frames is None else min(frames, max_frames)
+        deadline = self.origin + (self.frame + frames) * self.frame_period
+        if timer_deadline is not None:
+            deadline = min(deadline, timer_deadline)
+
+        events = []
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            event = pg.event.wait(math.ceil(remaining * 1000))
+            if event.type != pg.NOEVENT:
+                events.append(event)
+        events.extend(pg.event.get())
+
+        frame = int((time.monotonic() - self.origin) / self.frame_period + 1e-6)
+        elapsed = max(0, frame - self.frame)
+        self.frame += elapsed
+        return elapsed, events
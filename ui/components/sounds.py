@@ -0,0 +1,192 @@
+import logging
+import os
+import sys
+import threading
+import time
+import wave
+from array import array
+from collections import deque
+
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
+
+RATE = 44100
+CHANNELS = 2
+SAMPLE_WIDTH = 2 # bytes
+SAMPLE_MIN, SAMPLE_MAX = -32768, 32767
+_FLIP_SIGN = bytes(b ^ 0x80 for b in range(256))
+
+
+def _to_16bit(data: bytes, width: int) -> bytes:
+    """ Returns little-endian samples of width bytes as 16 bit samples, keeping their most significant bytes"""
+    if width == SAMPLE_WIDTH:
+        return data
+    out = bytearray(len(data) // width * 2)
+    if width == 1:
+        # 8 bit samples are unsigned
+        out[1::2] = data.translate(_FLIP_SIGN)
+    else:
+        out[0::2] = data[width - 2::width]
+        out[1::2] = data[width - 1::width]
+    return bytes(out)
+
+
+def _to_stereo(data: bytes) -> bytes:
+    """ Returns 16 bit mono samples duplicated on both channels"""
+    out = bytearray(len(data) * 2)
+    for byte in range(2):
+        out[byte::4] = data[byte::2]
+        out[byte + 2::4] = data[byte::2]
+    return bytes(out)
+
+
+def _resample(samples: array, rate: int, new_rate: int) -> array:
+    """ Returns stereo samples converted from rate to new_rate by linear interpolation"""
+    frames = len(samples) // CHANNELS
+    out = array('h', bytes(frames * new_rate // rate * CHANNELS * SAMPLE_WIDTH))
+    step = rate / new_rate
+    for i in range(len(out) // CHANNELS):
+        position = i * step
+        j = int(position)
+        k = min(j + 1, frames - 1)
+        fraction = position - j
+        for channel in range(CHANNELS):
+            a = samples[j * CHANNELS + channel]
+            out[i * CHANNELS + channel] = int(a + (samples[k * CHANNELS + channel] - a) * fraction)
+    return out
+
+
+def _mix(a: bytes, b: bytes) -> bytes:
+    """ Returns the sum of two buffers of 16 bit samples, clipped"""
+    return array('h', [max(SAMPLE_MIN, min(SAMPLE_MAX, x + y)) for x, y in zip(array('h', a), array('h', b))]).tobytes()
+
+
+class SoundBank:
+    """
+    Sounds of a folder decoded once into memory and played through a single long-lived output stream.
+    The stream callback mixes the playing sounds together, so sounds can overlap and a sound starts at
+    the next audio buffer instead of waiting for a file and a stream to be opened.
+    Without a PyAudio instance sounds are decoded but not played (headless mode).
+    """
+    def __init__(self, audio: "pyaudio.PyAudio", buffer_size: int = 256):
+        """ Constructor
+
+        Keyword arguments:
+        audio -- PyAudio instance or None for no audio output
+        buffer_size -- number of frames per audio buffer, a smaller buffer gives a lower latency
+        """
+        self.audio = audio
+        self.buffer_size = buffer_size
+        self.sounds = dict() # name -> PCM data in the stream format
+        self.stream = None
+        self._open_failed = False
+        self._voices = [] # [data, position, trigger time] of the playing sounds
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=100) # Trigger to first sample delays in seconds
+
+    def load(self, folder: str):
+        """ Decode every .wav file of folder"""
+        for file_name in sorted(os.listdir(folder)):
+            if file_name.endswith('.wav'):
+                try:
+                    self.sounds[file_name[:-4]] = self._decode(os.path.join(folder, file_name))
+                except (OSError, EOFError, wave.Error) as e:
+                    logging.error("Could not load sound {}: {}".format(file_name, e))
+        logging.debug("Loaded {} sounds ({} KB)".format(len(self.sounds), sum(map(len, self.sounds.values())) // 1024))
+
+    @staticmethod
+    def _decode(path: str) -> bytes:
+        """ Returns the file samples converted to the stream format"""
+        with wave.open(path) as f:
+            width, channels, rate = f.getsampwidth(), f.getnchannels(), f.getframerate()
+            data = f.readframes(f.getnframes())
+        if width not in [1, 2, 3, 4]:
+            raise wave.Error("unsupported sample width {}".format(width))
+        data = _to_16bit(data, width)
+        if channels == 1:
+            data = _to_stereo(data)
+        elif channels != CHANNELS:
+            raise wave.Error("unsupported number of channels {}".format(channels))
+        samples = array('h', data)
+        if sys.byteorder == 'big':
+            # WAV samples are little-endian, the stream takes native ones
+            samples.byteswap()
+        if rate != RATE:
+            samples = _resample(samples, rate, RATE)
+        return samples.tobytes()
+
+    def open(self):
+        """ Start the output stream. If the audio device can't be opened (missing or busy),
+        sounds are not played and the stream is opened again on the next play."""
+        if self.audio is None:
+            return
+        try:
+            self.stream = self.audio.open(format=self.audio.get_format_from_width(SAMPLE_WIDTH),
+                                          channels=CHANNELS,
+                                          rate=RATE,
+                                          output=True,
+                                          frames_per_buffer=self.buffer_size,
+                                          stream_callback=self._callback)
+        except OSError as e:
+            if not self._open_failed:
+                logging.error("Could not open the audio output: {}".format(e))
+            self._open_failed = True
+            self.stream = None
+            return
+        if self._open_failed:
+            logging.info("Audio output opened")
+            self._open_failed = False
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+
+    def play(self, name: str):
+        """ Start playing a sound. Returns immediately."""
+        if name not in self.sounds:
+            logging.error("Unknown sound {}".format(name))
+            return
+        if self.stream is None:
+            self.open()
+        if self.stream is None:
+            return
+        with self._lock:
+            self._voices.append([self.sounds[name], 0, time.perf_counter()])
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        """ Fill an output buffer with the sum of the playing sounds (audio thread)"""
+        size = frame_count * CHANNELS * SAMPLE_WIDTH
+        out = None
+        with self._lock:
+            voices = list(self._voices)
+        now = time.perf_counter()
+        for voice in voices:
+            data, position, triggered = voice
+            if position == 0:
+                # Time until this buffer reaches the DAC
+                output_delay = max(0, time_info.get('output_buffer_dac_time', 0) - time_info.get('current_time', 0))
+                self.latencies.append(now - triggered + output_delay)
+            chunk = data[position:position + size]
+            if len(chunk) < size:
+                chunk += bytes(size - len(chunk))
+            out = chunk if out is None else _mix(out, chunk)
+            voice[1] = position + size
+        if out is None:
+            out = bytes(size)
+        if voices:
+            with self._lock:
+                self._voices = [voice for voice in self._voices if voice[1] < len(voice[0])]
+        return out, pyaudio.paContinue
+
+    def stats(self) -> dict:
+        """ Trigger to first sample latency of the last played sounds in ms"""
+        latencies = list(self.latencies)
+        if not latencies:
+            return {'count': 0}
+        return {'count': len(latencies),
+                'mean': sum(latencies) * 1000 / len(latencies),
+                'max': max(latencies) * 1000}
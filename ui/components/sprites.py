@@ -1,25 +1,31 @@
 import time
 import pygame as pg
-import json
 from typing import Union
 
+from ui.components import motion
+from ui.components.assets import asset_cache
+from ui.components.manifests import manifests
+from ui.components.motion import motion_table
+from ui.components.scheduler import seconds_to_frames
 
 
 class Sprite(pg.sprite.Sprite):
     """ Base Sprite class that load an image and offers methods to change position and size.
     """
     updated = False
+    static = True # The sprite never changes by itself and can be flattened with the background
     def __init__(self, sprite_path: str):
-        """ Load sprite image.
+        """ Constructor. The image is taken from the asset cache when the sprite is sized (see set_rect and set_size),
+        the full scale image is only decoded if the scaled image is not cached.
 
         Keyword arguments:
         sprite_path -- the sprite image path
         """
         super().__init__()
         self.sprite_path = sprite_path
-        self.fs_image = pg.image.load(sprite_path) # Fullscale image
-        self.image = self.fs_image
-        self.rect = self.image.get_rect()
+        self.image = None
+        self.rect = pg.Rect(0, 0, 0, 0)
+        self.size = None # Size of the scaled image held from the asset cache
 
     def set_pos(self, pos : Union[list, tuple], center: bool = False):
         """ Set image position on target surface.
@@ -61,41 +67,74 @@ class Sprite(pg.sprite.Sprite):
         Keyword arguments:
         new_size -- the new size to be applied [width, height]
         """
-        self.image = pg.transform.scale(self.image, [int(v) for v in new_size])
+        new_size = [int(v) for v in new_size]
+        self.image = asset_cache.acquire(self.sprite_path, new_size)
+        if self.size is not None:
+            asset_cache.release(self.sprite_path, self.size)
+        self.size = new_size
         self.rect = self.image.get_rect()
         self.updated = True
 
+    def update(self, ticks: int = 1):
+        """ Advance the sprite of ticks frames"""
+        pass
+
+    def next_change(self, frame_period: float) -> int:
+        """ Returns the number of frames before the sprite changes by itself, None if it never does.
+
+        Keyword arguments:
+        frame_period -- duration of a frame in seconds
+        """
+        return None
+
+    def release(self):
+        """ Give back the images held from the asset cache"""
+        if self.size is not None:
+            asset_cache.release(self.sprite_path, self.size)
+            self.size = None
+
 
 class Bouncing_Sprite(Sprite):
-    """ A sprite that move up and down with a given Amplitude"""
+    """ A sprite that move up and down with a given Amplitude.
+    The offset is read from a motion table shared by the sprites with the same amplitude and speed,
+    at the time of the motion clock, so the motion speed doesn't depend on the frame rate.
+    """
+    static = False
     def __init__(self, sprite_path: str, amplitude: int = 5, speed : float = 0.5):
         """ Constructor.
 
         Keyword arguments:
         sprite_path -- image file path
         amplitude -- number of pixels to move up and down
-        speed -- number of pixels to move at each frame
+        speed -- number of pixels to move at each frame (at motion.REFERENCE_FPS)
         """
         super().__init__(sprite_path)
         self.pos = self.rect.y
-        self.curr_offset, self.direction = 0, True
+        self.curr_offset = 0
         self.amplitude = amplitude
         self.speed =  speed
+        self.table = motion_table(amplitude, speed)
 
     def set_pos(self, pos : Union[list, tuple], center: bool = False):
         super().set_pos(pos, center)
         self.pos = self.rect.y
+        self.rect.y = self.pos + self.curr_offset
+
+    def update(self, ticks: int = 1):
+        offset = self.table.offset(motion.clock())
+        if offset != self.curr_offset:
+            # Only frames where the integer offset changes move pixels
+            self.curr_offset = offset
+            self.rect.y = self.pos + offset
+            self.updated = True
 
-    def update(self):
-        move = self.speed * (1 if self.direction else -1)
-        self.curr_offset += move
-        self.rect.y = int(self.pos + self.curr_offset)
-        if abs(self.curr_offset) > self.amplitude:
-            self.direction = not self.direction
-        self.updated = True        
+    def next_change(self, frame_period: float) -> int:
+        return seconds_to_frames(self.table.next_change(motion.clock()), frame_period)
 
 class Animated_Sprite(Sprite):
-    """ An animated sprite."""
+    """ An animated sprite. The sprite sheet is scaled once into an atlas shared through the asset cache,
+    frames are subsurface views into the atlas and the full scale sheet is not kept.
+    """
     def __init__(self, sprite_path: str):
         """ Constructor for a animated sprite need the presence of a json file describing animation parameters
 
@@ -104,9 +143,13 @@ class Animated_Sprite(Sprite):
 
         """
         super().__init__(sprite_path)
-        self._read_manifest(".".join(sprite_path.split('.')[:-1]) + '.json')
         self.frame_counter = 0
         self.curr_frame = 0
+        self._read_manifest(".".join(sprite_path.split('.')[:-1]) + '.json')
+
+    @property
+    def static(self) -> bool:
+        return self.nb_frames < 2
 
     def _read_manifest(self, manifest_path):
         """ Read the animation manifest and extract animation parameters
@@ -114,49 +157,60 @@ class Animated_Sprite(Sprite):
         Keyword arguments:
         manifest_path -- the json manifest path
         """
+        manifest = manifests.get(manifest_path)
+        self.nb_frames = manifest['nb_frames']
+        if 'frame_duration' in manifest.keys():
+            self.frame_duration = manifest['frame_duration']
+        else:
+            self.frame_duration = 1
+        self.frame_width = manifest['frame_width']
         self.frames = []
-        with open(manifest_path, 'r') as f:
-            manifest = json.load(f)
-            self.nb_frames = manifest['nb_frames']
-            if 'frame_duration' in manifest.keys():
-                self.frame_duration = manifest['frame_duration']
-            else:
-                self.frame_duration = 1
-            frame_width = manifest['frame_width']
-            for i in range(self.nb_frames):
-                frame = self.image.subsurface((i*frame_width, 0, frame_width, self.rect.h))
-                self.frames.append(frame)
-                self.rect = frame.get_rect()
+
+    def _scale_sheet(self, atlas_size: list) -> pg.Surface:
+        """ Returns the frames of the sprite sheet scaled into a single atlas surface"""
+        sheet = asset_cache.acquire(self.sprite_path)
+        try:
+            frames_area = (0, 0, self.frame_width * self.nb_frames, sheet.get_height())
+            return asset_cache.scale(sheet.subsurface(frames_area), atlas_size)
+        finally:
+            asset_cache.release(self.sprite_path)
 
     def set_rect(self,surface, rect, center=False):
         """ Adapt the set_rect parent function to multiple sprite elements"""
         surface_size = surface.get_rect().size
         new_rect = [v * rect[i] for i,v in enumerate(surface_size+surface_size)]
-        self.rect = pg.Rect(new_rect)
-        new_frames = []
-        for f in self.frames:
-            f = pg.transform.scale(f, [int(v) for v in new_rect[2:]])
-            self.set_pos(new_rect[:2], center=center)
-            offset_x = 0
-            offset_y = 0
-            if center:
-                offset_x += f.get_rect().w/2
-                offset_y += f.get_rect().h/2
-            self.rect.x = new_rect[0] - offset_x
-            self.rect.y = new_rect[1] - offset_y
-            new_frames.append(f)
-        self.frames = new_frames
-        self.image = self.frames[0]
-        self.updated = True
+        new_size = [int(v) for v in new_rect[2:]]
+        atlas_size = [new_size[0] * self.nb_frames, new_size[1]]
+        atlas = asset_cache.acquire(self.sprite_path, atlas_size, 'atlas', loader=lambda: self._scale_sheet(atlas_size))
+        if self.size is not None:
+            asset_cache.release(self.sprite_path, self.atlas_size, 'atlas')
+        self.size = new_size
+        self.atlas_size = atlas_size
+        self.frames = [atlas.subsurface((i * new_size[0], 0, new_size[0], new_size[1])) for i in range(self.nb_frames)]
+        self.image = self.frames[self.curr_frame]
+        self.rect = self.image.get_rect()
+        self.set_pos(new_rect[:2], center=center)
 
-    def update(self):
-        self.frame_counter += 1
+    def release(self):
+        """ Give back the atlas held from the asset cache"""
+        if self.size is not None:
+            asset_cache.release(self.sprite_path, self.atlas_size, 'atlas')
+            self.size = None
+        super().release()
+
+    def update(self, ticks: int = 1):
+        self.frame_counter += ticks
         if self.frame_counter >= self.frame_duration:
-            self.frame_counter = 0
-            self.curr_frame = (self.curr_frame + 1) % self.nb_frames
+            steps, self.frame_counter = divmod(self.frame_counter, self.frame_duration)
+            self.curr_frame = (self.curr_frame + steps) % self.nb_frames
             self.image = self.frames[self.curr_frame]
             self.updated = True
 
+    def next_change(self, frame_period: float) -> int:
+        if self.nb_frames < 2:
+            return None
+        return self.frame_duration - self.frame_counter
+
 
 def SpriteFactory(sprite_path : str, mode : str, surface : pg.Surface, rect : list) -> Sprite :
     """ Returns the proper sprite class according to mode and set the proper size and coordinates
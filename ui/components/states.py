@@ -21,6 +21,8 @@ class Mode:
         self.current_state = self.default_state
         #Events
         self.events = manifest['events']
+        #Frame rate, default is used if not set
+        self.fps = manifest.get('fps', None)
     
     def set(self, previous_mode):
         """Set this mode as the current mode"""
@@ -41,10 +43,9 @@ class State:
     def __init__(self, manifest: dict, manager):
         self.id = manifest['state_name']
         self.manager = manager
-        # Animation
-        try:
-            self.animation = self.manager.animations[manifest['animation']]
-        except KeyError:
+        # Animation, built when the state is set
+        self.animation = manifest['animation']
+        if self.animation not in self.manager.animations:
             logging.warning("Could not set animation {} for state {}.".format(manifest['animation'], self.id))
         
         #Buttons
@@ -1,7 +1,11 @@
 import pygame as pg
+import math
 import time
 import datetime
 
+from ui.components.fonts import fonts
+from ui.components.scheduler import seconds_to_frames
+
 class TextBox(pg.sprite.Sprite):
     updated = False
     font_name = "Comic Sans MS"
@@ -14,58 +18,87 @@ class TextBox(pg.sprite.Sprite):
         self.text = text
         self.pos = pos
         self.font_name = self.font_name
-        self.font = pg.font.SysFont(self.font_name, self.font_size)
+        self.font_size = self.font_size
+        self.font = fonts.get(self.font_name, self.font_size)
         self.color = self.color
         self._create_surface()
         
     def _create_surface(self):
-        self.image = self.font.render(self.text, True, self.color)
+        self.image = fonts.render(self.font_name, self.font_size, self.text, self.color)
         self.rect = pg.Rect(self.pos[0], self.pos[1], self.image.get_rect().width, self.image.get_rect().height)
         self.updated = True
 
     def set_text(self, text):
+        """ Change the displayed text, nothing is rendered if the text is unchanged"""
+        if text == self.text:
+            return
         self.text = text
         self._create_surface()
     
     def set_font_size(self, font_size : int):
-        self.font = pg.font.SysFont(self.font_name, font_size)
+        self.font_size = font_size
+        self.font = fonts.get(self.font_name, font_size)
         self._create_surface()
 
     def set_color(self, color : tuple):
         self.color = color
         self._create_surface()
 
-    def update(self):
+    def update(self, ticks: int = 1):
         pass
 
+    def next_change(self, frame_period: float) -> int:
+        return None
+
 class TextTimer(TextBox):
     def __init__(self, pos):
         super().__init__("00:00:00", pos)
         self.start_time = time.time()
+        self.end_time = self.start_time
+        self._second = None
     
     def start_timer(self, duration : "Duration in minutes"):
         self.start_time = time.time()
         self.end_time = self.start_time + duration * 60
 
-    def update(self):
+    def update(self, ticks: int = 1):
         remaining_time = self.end_time - time.time()
+        if int(remaining_time) == self._second:
+            return
+        self._second = int(remaining_time)
         sign = '-' if remaining_time >= 0 else '+'
         remaining_time = abs(remaining_time)
         minutes = remaining_time // 60
         hours = minutes // 60
         minutes -= 60 * hours
         remaining_time -= (hours * 3600 + minutes * 60)
-        self.text = "{}{:02d}:{:02d}:{:02d}".format(sign, int(hours), int(minutes), int(remaining_time))
-        self._create_surface()
+        self.set_text("{}{:02d}:{:02d}:{:02d}".format(sign, int(hours), int(minutes), int(remaining_time)))
+
+    def _create_surface(self):
+        # Timer strings rarely repeat, compose them from the glyph cache
+        self.image = fonts.render_glyphs(self.font_name, self.font_size, self.text, self.color)
+        self.rect = pg.Rect(self.pos[0], self.pos[1], self.image.get_width(), self.image.get_height())
+        self.updated = True
+
+    def next_change(self, frame_period: float) -> int:
+        return seconds_to_frames((self.end_time - time.time()) % 1, frame_period)
 
 class DateTime(TextBox):
     font_size = 40
     color = (75,75,75)
     def __init__(self, pos):
+        self._second = int(time.time())
         super().__init__(datetime.datetime.now().strftime('%d/%m/%Y %H:%M:%S') + ' ', pos)
-    def update(self):
-        self.set_text(datetime.datetime.now().strftime('%d/%m/%Y %H:%M:%S')+ ' ')
-        self.updated = True
+
+    def update(self, ticks: int = 1):
+        # The text only changes once per second
+        second = int(time.time())
+        if second != self._second:
+            self._second = second
+            self.set_text(datetime.datetime.fromtimestamp(second).strftime('%d/%m/%Y %H:%M:%S')+ ' ')
+
+    def next_change(self, frame_period: float) -> int:
+        return seconds_to_frames(1 - time.time() % 1, frame_period)
 
 
 class Frame(pg.sprite.Sprite):
@@ -86,6 +119,9 @@ class Frame(pg.sprite.Sprite):
             self.image = pg.Surface.convert_alpha(self.image)
         self.rect = pg.Rect(rect)
 
+    def next_change(self, frame_period: float) -> int:
+        return None
+
 class MessageFrame(Frame):
     padding = 5
     font_name = "Comic Sans MS"
@@ -95,42 +131,75 @@ class MessageFrame(Frame):
         super().__init__(rect)
         self.centered = center
         self.text = text
-        self.font = pg.font.SysFont(self.font_name, self.font_size)
+        self.font = fonts.get(self.font_name, self.font_size)
         self._init_image()
 
     def _init_image(self):
         self.image = pg.Surface([self.rect.width, self.rect.height], pg.SRCALPHA|pg.HWSURFACE)
         self.dist_ftop = 0
         for line in self.text.split('\n'):
-            text_img = self.font.render(line, True, self.font_color)
+            text_img = fonts.render(self.font_name, self.font_size, line, self.font_color)
             self.image.blit(text_img, [(self.rect.width/2) - text_img.get_width()/2 if self.centered else self.padding , self.dist_ftop + self.padding])
             self.dist_ftop += text_img.get_height()
 
 class MeetingTimer(MessageFrame):
+    """ Countdown displayed below a message.
+    The frame and message are drawn once, then only the digits region is redrawn, once a second.
+    dirty_rect holds that region so the renderer only pushes those pixels to the display.
+    """
     timer_font_size = 40
-    callback_fun = None
-    callback_times = []
+    expired_color = (255,0,0)
     def __init__(self, rect: list, text: str, duration: int):
         super().__init__(rect, text)
-        self.static_image = self.image.copy()
         self.end_time = time.time() + duration
+        self.callback_fun = None
+        self.callback_times = []
+        self._schedule = [] # Minutes left triggering the callback, in decreasing order
+        self._expired = False
+
+    def _init_image(self):
+        super()._init_image()
+        self.static_image = self.image
+        self.image = self.static_image.copy()
+        self.timer_rect = None # Area of the digits in the image
+        self.dirty_rect = None
+        self._second = None
 
     def start_timer(self, duration : "Duration in minutes"):
         self.start_time = time.time()
         self.end_time = self.start_time + duration * 60
+        self._second = None
+        self._schedule_callbacks()
 
     def set_callback(self, callback_times : list, callback_fun):
-        self.callback_times = callback_times
+        self.callback_times = list(callback_times)
         self.callback_fun = callback_fun
+        self._schedule_callbacks()
+
+    def _schedule_callbacks(self):
+        minutes = int(self.end_time - time.time()) // 60
+        self._schedule = sorted((t for t in set(self.callback_times) if t <= minutes), reverse=True)
+
+    def next_change(self, frame_period: float) -> int:
+        return seconds_to_frames((self.end_time - time.time()) % 1, frame_period)
 
-    def update(self):
+    def update(self, ticks: int = 1):
         remaining_time = self.end_time - time.time()
-        if int(remaining_time) == 0:
-            self.set_timer_color((255,0,0))
-        
-        if int(remaining_time)//60 in self.callback_times:
-            self.callback_fun(int(remaining_time)//60)
-            self.callback_times.remove(int(remaining_time)//60)
+        # Rounded down so that the second after expiry (shown with a +) gets its own redraw
+        second = math.floor(remaining_time)
+        if second == self._second:
+            return
+        if second <= 0 and not self._expired:
+            self._expired = True
+            self.set_timer_color(self.expired_color)
+        self._second = second
+
+        minutes = self._second // 60
+        while self._schedule and minutes <= self._schedule[0]:
+            threshold = self._schedule.pop(0)
+            if self.callback_fun is not None:
+                self.callback_fun(threshold)
+
         sign = '-' if remaining_time >= 0 else '+'
         remaining_time = abs(remaining_time)
         minutes = remaining_time // 60
@@ -138,11 +207,17 @@ class MeetingTimer(MessageFrame):
         minutes -= 60 * hours
         remaining_time -= (hours * 3600 + minutes * 60)
         text = "{}{:02d}:{:02d}:{:02d}".format(sign, int(hours), int(minutes), int(remaining_time))
-        self.font = pg.font.SysFont(self.font_name, self.timer_font_size)
-        text_img = self.font.render(text, True, self.font_color)
-        self.image = self.static_image.copy()
-        self.image.blit(text_img, [(self.rect.width/2) - text_img.get_width()/2, self.dist_ftop + self.padding])
+        text_img = fonts.render_glyphs(self.font_name, self.timer_font_size, text, self.font_color)
+        text_rect = text_img.get_rect(topleft=[(self.rect.width/2) - text_img.get_width()/2, self.dist_ftop + self.padding])
+        area = text_rect if self.timer_rect is None else text_rect.union(self.timer_rect)
+        # Exact copy of the static frame over the previous digits
+        self.image.fill((0,0,0,0), area)
+        self.image.blit(self.static_image, area, area=area, special_flags=pg.BLEND_RGBA_ADD)
+        self.image.blit(text_img, text_rect)
+        self.timer_rect = text_rect
+        self.dirty_rect = area
+        self.updated = True
     
     def set_timer_color(self, color):
         self.font_color = color
-        self._init_image()
\ No newline at end of file
+        self._init_image()
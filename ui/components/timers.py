@@ -0,0 +1,70 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class TimerHandle:
+    """ A scheduled call, returned by TimerQueue.call_later"""
+    __slots__ = ('deadline', 'callback', 'args', 'cancelled')
+
+    def __init__(self, deadline: float, callback, args: tuple):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """ Prevent the call from happening. Has no effect if it already happened."""
+        self.cancelled = True
+
+
+class TimerQueue:
+    """
+    Heap of timed calls run by the render loop (see run_due). It replaces one sleeping thread per timer:
+    calls happen on the render thread, in deadline order, and can be cancelled through their handle.
+    """
+    def __init__(self, clock=time.monotonic):
+        """ Constructor
+
+        Keyword arguments:
+        clock -- function returning the current time in seconds (default time.monotonic)
+        """
+        self.clock = clock
+        self._heap = []
+        self._counter = itertools.count() # Keeps insertion order for equal deadlines
+        self._lock = threading.Lock()
+
+    def call_later(self, delay: float, callback, *args) -> TimerHandle:
+        """ Schedule callback(*args) in delay seconds"""
+        handle = TimerHandle(self.clock() + delay, callback, args)
+        with self._lock:
+            heapq.heappush(self._heap, (handle.deadline, next(self._counter), handle))
+        return handle
+
+    def next_deadline(self) -> float:
+        """ Returns the time of the next pending call or None"""
+        with self._lock:
+            while self._heap and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def run_due(self, now: float = None) -> int:
+        """ Run the calls whose deadline has passed, returns the number of calls made"""
+        now = self.clock() if now is None else now
+        count = 0
+        while True:
+            with self._lock:
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                handle = heapq.heappop(self._heap)[2]
+            if handle.cancelled:
+                continue
+            handle.cancelled = True
+            handle.callback(*handle.args)
+            count += 1
+        return count
+
+    def __len__(self):
+        with self._lock:
+            return sum(1 for _, _, handle in self._heap if not handle.cancelled)
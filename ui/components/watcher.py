@@ -0,0 +1,102 @@
+import logging
+import os
+import threading
+import time
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+class FileWatcher(threading.Thread):
+    """
+    Watches the files of a set of folders (not their subfolders) and calls back with the paths
+    modified, added or removed. Uses inotify when inotify_simple is installed, otherwise polls the
+    modification times. Changes are batched until the folders are quiet, so that saving several files
+    at once gives a single callback. The callback is called from the watcher thread.
+    """
+    def __init__(self, folders: list, callback, interval: float = 1, settle: float = 0.2, suffixes: tuple = ('.json', '.png', '.jpg')):
+        """ Constructor
+
+        Keyword arguments:
+        folders -- folders to watch
+        callback -- callable taking the set of changed file paths
+        interval -- polling period in seconds
+        settle -- time in seconds without change before the callback is called (inotify)
+        suffixes -- extensions of the files watched, other files (e.g. editor swap files) are ignored
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.folders = [os.path.normpath(folder) for folder in folders]
+        self.callback = callback
+        self.interval = interval
+        self.settle = settle
+        self.suffixes = suffixes
+        self.alive = True
+
+    def stop(self):
+        self.alive = False
+
+    def run(self):
+        if inotify_simple is not None:
+            self._run_inotify()
+        else:
+            logging.debug("inotify_simple is not installed, polling {} folders".format(len(self.folders)))
+            self._run_polling()
+
+    def _notify(self, paths: set):
+        logging.debug("Files changed: {}".format(", ".join(sorted(paths))))
+        self.callback(paths)
+
+    def _snapshot(self) -> dict:
+        """ Returns the modification time of every watched file"""
+        mtimes = dict()
+        for folder in self.folders:
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.endswith(self.suffixes):
+                    try:
+                        mtimes[entry.path] = entry.stat().st_mtime_ns
+                    except OSError:
+                        continue
+        return mtimes
+
+    def _run_polling(self):
+        mtimes = self._snapshot()
+        pending = set()
+        while self.alive:
+            time.sleep(self.interval)
+            current = self._snapshot()
+            changed = {path for path in mtimes.keys() | current.keys() if mtimes.get(path) != current.get(path)}
+            mtimes = current
+            if changed:
+                pending |= changed
+            elif pending:
+                self._notify(pending)
+                pending = set()
+
+    def _run_inotify(self):
+        flags = inotify_simple.flags
+        mask = flags.CLOSE_WRITE | flags.CREATE | flags.DELETE | flags.MOVED_TO | flags.MOVED_FROM
+        inotify = inotify_simple.INotify()
+        folders = dict() # watch descriptor -> folder
+        for folder in self.folders:
+            try:
+                folders[inotify.add_watch(folder, mask)] = folder
+            except OSError as e:
+                logging.warning("Could not watch {}: {}".format(folder, e))
+        try:
+            while self.alive:
+                events = inotify.read(timeout=int(self.interval * 1000))
+                pending = set()
+                while events:
+                    pending.update(os.path.join(folders[event.wd], event.name) for event in events
+                                   if event.wd in folders and event.name.endswith(self.suffixes))
+                    events = inotify.read(timeout=int(self.settle * 1000))
+                if pending:
+                    self._notify(pending)
+        finally:
+            inotify.close()
@@ -7,22 +7,34 @@ import json
 import logging
 import os
 import sys
-import threading
-import time
 from enum import Enum
 from typing import Union
 
 import pygame as pg
 from pygame.locals import *
 
-import wave
-import pyaudio
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
 
-from ui.components.animations import Animation, Timed_Animation
+from ui.components.animations import Animation, AnimationRegistry, Timed_Animation
+from ui.components.assets import BakedAssets, DiskCache, asset_cache
 from ui.components.buttons import Button_Factory
 from ui.components.eventmanager import Event_Manager
+from ui.components.hitmap import HitMap
+from ui.components.localbroker import LocalBroker
+from ui.components.manifests import ManifestError, manifests
+from ui.components.mixer import NullMixer
+from ui.components.prefetch import Prefetcher
+from ui.components.profiler import Profiler, ProfilerOverlay, null_profiler
+from ui.components.renderer import Renderer
+from ui.components.scheduler import FrameScheduler, wake
+from ui.components.sounds import SoundBank
 from ui.components.states import Mode, State
 from ui.components.texts import DateTime, MessageFrame, TextBox, MeetingTimer
+from ui.components.timers import TimerQueue
+from ui.components.watcher import FileWatcher
 
 if getattr(sys, 'frozen', False):
     FILE_PATH = os.path.dirname(sys.executable)
@@ -31,42 +43,72 @@ else:
 
 BACKGROUND_COLOR = (200,200,200)
 FPS = 30
+WATCHED_FOLDERS = ['animations', 'states', 'modes', 'buttons', 'sprites']
 
 class Linto_UI:
     def __init__(self, args, config):
         self.config = config
         self.args = args
+        if args.headless:
+            # No display, audio, mixer nor broker: the UI runs offscreen against an in-process broker
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
+        self.local_broker = LocalBroker() if args.headless else None
+        manifests.load(manifest_bundle_path(config))
         pg.display.init()
         pg.font.init()
 
         # Init display
         self.screen_size = args.resolution
         self.screen = self.init_gui(self.screen_size, args.fullscreen)
-        self.background = pg.Surface(self.screen_size, flags=pg.HWSURFACE)
+        self.background = pg.Surface(self.screen_size, flags=pg.HWSURFACE).convert()
+        if self.config.get('disk_cache', fallback=''):
+            asset_cache.disk = DiskCache(os.path.expanduser(self.config['disk_cache']), self.screen_size)
+        if self.config.get('baked_assets', fallback=''):
+            baked = BakedAssets(os.path.join(FILE_PATH, os.path.expanduser(self.config['baked_assets'])))
+            if baked.select(self.screen_size) is not None:
+                asset_cache.baked = baked
+                logging.debug("Using baked assets for {}x{}".format(*baked.bucket))
 
         #Background image
-        self.background.blit(pg.image.load(os.path.join(FILE_PATH, "sprites", "back.jpg")), [0,0])
+        self.background_path = os.path.join(FILE_PATH, "sprites", "back.jpg")
+        self.draw_background()
         
         self.screen.blit(self.background, [0,0])
         pg.display.update()
         self.center_pos = [v//2 for v in self.screen_size]
+        self.renderer = Renderer(self.screen, self.background)
+        if args.profile or self.config.getboolean('profiler', fallback=False):
+            self.profiler = Profiler(self.config.getint('profiler_frames', fallback=300))
+        else:
+            self.profiler = null_profiler
+        self.renderer.profiler = self.profiler
+        self.scheduler = FrameScheduler(FPS)
+        self.timers = TimerQueue()
+        self._state_timeouts = [] # Pending timeout handles of the current state
             
         self.render_sprites = pg.sprite.OrderedUpdates()
         self.overlay_sprites = pg.sprite.OrderedUpdates()
         if args.time:
             self.overlay_sprites.add(DateTime([10,10]))
-        self.updated_rects = []
+        if self.profiler.enabled:
+            self.overlay_sprites.add(ProfilerOverlay(self.profiler, [10,55]))
 
         #Animations
-        self.animations = dict()
         self.load_animations('animations')
 
         #Event_Manager
-        self.event_manager = Event_Manager(self, config)
+        if args.headless:
+            self.event_manager = Event_Manager(self, config, NullMixer(), lambda: self.local_broker)
+        else:
+            self.event_manager = Event_Manager(self, config)
+        self.event_manager.profiler = self.profiler
 
         #Buttons
         self.buttons = pg.sprite.Group()
         self.buttons_visible = pg.sprite.OrderedUpdates()
+        self.hitmap = HitMap(self.screen_size, use_alpha=self.config.getboolean('hit_alpha', fallback=False))
+        self.touch_down = self.config.getboolean('touch_down', fallback=True)
         self.load_buttons()
         
         #States
@@ -78,13 +120,32 @@ class Linto_UI:
         self.modes = {}
         self.load_modes('modes')
         self.current_mode = None
+        self.event_manager.compile(self.modes, self.states)
         
+        asset_cache.trim()
+        asset_cache.log_stats()
+
+        #Prefetcher
+        self.prefetcher = Prefetcher(self, self.config.getint('prefetch_depth', fallback=2))
+
         self.set_mode('command')
         self.set_state('init')
         self.event_manager.start()
+        self.prefetcher.start()
+        if self.profiler.enabled:
+            self.timers.call_later(self.config.getint('profiler_interval', fallback=10), self.publish_stats)
+        self.watcher = None
+        if args.hot_reload or self.config.getboolean('hot_reload', fallback=False):
+            self.watcher = FileWatcher([os.path.join(FILE_PATH, folder) for folder in WATCHED_FOLDERS],
+                                       lambda paths: self.event_manager.queue.post(self.reload, paths),
+                                       self.config.getfloat('hot_reload_interval', fallback=1))
+            self.watcher.start()
 
         # Sound init
-        self.audio = pyaudio.PyAudio()
+        self.audio = pyaudio.PyAudio() if pyaudio is not None and not args.headless else None
+        self.sounds = SoundBank(self.audio, config.getint('sound_buffer_size', fallback=256))
+        self.sounds.load(os.path.join(FILE_PATH, 'sounds'))
+        self.sounds.open()
         
     def init_gui(self,resolution, fullscreen: bool):
         """ Init pygame modules and set the display surface
@@ -94,7 +155,7 @@ class Linto_UI:
         fullscreen -- (boolean) Set display to fullscreen
         """
         
-        if not self.config['debug'] == 'true' and not self.args.debug:
+        if not self.config['debug'] == 'true' and not self.args.debug and not self.args.headless:
             pg.mouse.set_cursor((8,8),(0,0),(0,0,0,0,0,0,0,0),(0,0,0,0,0,0,0,0))
         display = pg.display.Info()
         self.display_width = display.current_w
@@ -102,24 +163,23 @@ class Linto_UI:
         logging.debug("Using resolution ({},{})".format(self.display_width, self.display_height))
         return pg.display.set_mode(resolution,pg.FULLSCREEN|pg.HWSURFACE if fullscreen else pg.NOFRAME|pg.HWACCEL)
         
+    def draw_background(self):
+        """ Draw the background image on the background surface"""
+        self.background.blit(asset_cache.acquire(self.background_path), [0,0])
+        asset_cache.release(self.background_path)
+
     def load_animations(self, folder: 'animation folder'):
-        """Load all the .json file in a specified folder as animations.
+        """Read all the .json animation manifests in a specified folder. Animations are built when first played.
         
         Keyword arguments:
         folder -- An absolute path to a folder containing .json animation manifests
         """
-        self.animations = dict()
         logging.debug("Loading animations")
-        for file_name in os.listdir(os.path.join(FILE_PATH, folder)):
-            file_path = os.path.join(FILE_PATH, folder, file_name)
-            if file_path.endswith(".json"):
-                with open(file_path, 'r') as f:
-                    manifest = json.load(f)
-                    if manifest['type'] in ['timed']:
-                        anim = Timed_Animation(self.screen, manifest, self.render_sprites)
-                    else:
-                        anim = Animation(self.screen, manifest, self.render_sprites)
-                    self.animations[anim.id] = anim
+        budget = self.config.getint('animation_cache_size', fallback=None)
+        self.animations = AnimationRegistry(self.screen, self.render_sprites,
+                                            budget=budget * 1024 * 1024 if budget else None,
+                                            pinned=['init'])
+        self.animations.load(os.path.join(FILE_PATH, folder))
     
     def load_states(self, folder : str='states'):
         """Load all the .json file in a specified folder as states.
@@ -127,12 +187,8 @@ class Linto_UI:
         Keyword arguments:
         folder -- An absolute path to a folder containing .json state manifests
         """
-        for file_name in os.listdir(os.path.join(FILE_PATH,folder)):
-            file_path = os.path.join(FILE_PATH, folder, file_name)
-            if file_path.endswith('.json'):
-                with open(file_path) as f:
-                    manifest = json.load(f)
-                    self.states[manifest['state_name']] = State(manifest, self)
+        for manifest in manifests.folder(os.path.join(FILE_PATH, folder)).values():
+            self.states[manifest['state_name']] = State(manifest, self)
     
     def load_modes(self, folder: str='modes'):
         """Load all the .json file in a specified folder as modes.
@@ -140,12 +196,8 @@ class Linto_UI:
         Keyword arguments:
         folder -- An absolute path to a folder containing .json mode manifests
         """
-        for file_name in os.listdir(os.path.join(FILE_PATH, folder)):
-            file_path = os.path.join(FILE_PATH, folder, file_name)
-            if file_path.endswith('.json'):
-                with open(file_path) as f:
-                    manifest = json.load(f)
-                    self.modes[manifest['mode_name']] = Mode(manifest, self)
+        for manifest in manifests.folder(os.path.join(FILE_PATH, folder)).values():
+            self.modes[manifest['mode_name']] = Mode(manifest, self)
 
     def load_buttons(self, folder: str='buttons'):
         """Load all the .json file in a specified folder as buttons.
@@ -155,11 +207,107 @@ class Linto_UI:
         """
         self.buttons = dict()
         logging.debug("Loading Buttons")
-        for file_name in os.listdir(os.path.join(FILE_PATH,folder)):
-            file_path = os.path.join(FILE_PATH, folder, file_name)
-            if file_path.endswith('.json'):
-                button = Button_Factory(file_path, self.screen, self.event_manager)
+        for file_path in manifests.folder(os.path.join(FILE_PATH, folder)).keys():
+            button = Button_Factory(file_path, self.screen, self.event_manager)
+            self.buttons[button.id] = button
+
+    def reload(self, paths: set):
+        """ Rebuild the animations, buttons, states and modes affected by modified files and swap them in,
+        keeping the current mode and state. Called on the render thread, so no frame sees a partial reload.
+        If the manifests don't compile anymore, nothing is reloaded.
+
+        Keyword arguments:
+        paths -- paths of the modified, added or removed files
+        """
+        previous = manifests.snapshot()
+        previous_topics = manifests.topics
+        try:
+            manifests.load(manifest_bundle_path(self.config))
+        except ManifestError as e:
+            logging.error("Reload cancelled: {}".format(e))
+            return
+        current = manifests.snapshot()
+        changed = {path for path in previous.keys() | current.keys() if previous.get(path) != current.get(path)}
+        changed |= {os.path.normpath(path) for path in paths}
+        in_folder = lambda folder: {path for path in changed if os.path.basename(os.path.dirname(path)) == folder}
+        names = lambda paths, key: {manifest[key] for path in paths for manifest in [previous.get(path), current.get(path)] if manifest}
+
+        # Images are loaded again, as well as the sprite sheets whose frames changed
+        images = in_folder('sprites') | in_folder('buttons')
+        asset_cache.invalidate({os.path.splitext(path)[0] + '.png' if path.endswith('.json') else path for path in images})
+        if os.path.normpath(self.background_path) in images:
+            self.draw_background()
+            self.renderer.invalidate()
+
+        # Animations using a modified manifest, sprite or sprite sheet
+        sprites = {os.path.splitext(os.path.basename(path))[0] for path in in_folder('sprites')}
+        animations = names(in_folder('animations'), 'id')
+        for name, manifest in self.animations.manifests.items():
+            if os.path.join(FILE_PATH, 'placeholders.json') in changed or \
+                    any(sprite.get('sprite_name') in sprites for sprite in manifest['sprites'].values()):
+                animations.add(name)
+        self.animations.reload(os.path.join(FILE_PATH, 'animations'), animations)
+
+        # Buttons, keeping the frame shown by state and switch buttons
+        buttons = set()
+        for manifest_path in {os.path.splitext(path)[0] + '.json' for path in in_folder('buttons')}:
+            button_names = names([manifest_path], 'name')
+            old_buttons = [self.buttons.pop(name) for name in button_names if name in self.buttons]
+            # Released before the new button acquires its images, which may have the same cache keys
+            for old_button in old_buttons:
+                if hasattr(old_button, 'release'):
+                    old_button.release()
+            if manifest_path in current:
+                button = Button_Factory(manifest_path, self.screen, self.event_manager)
                 self.buttons[button.id] = button
+                if old_buttons and hasattr(button, 'set_state'):
+                    button.set_state(getattr(old_buttons[0], 'curr_frame', 0), notify=False)
+            buttons |= button_names
+
+        # States using a modified manifest or button, then modes using a rebuilt state
+        state_paths = in_folder('states')
+        states = names(state_paths, 'state_name')
+        for path, manifest in manifests.folder(os.path.join(FILE_PATH, 'states')).items():
+            if buttons & set(manifest['buttons']):
+                states.add(manifest['state_name'])
+        self.states = {name: state for name, state in self.states.items() if name not in states}
+        for manifest in manifests.folder(os.path.join(FILE_PATH, 'states')).values():
+            if manifest['state_name'] in states:
+                self.states[manifest['state_name']] = State(manifest, self)
+        modes = names(in_folder('modes'), 'mode_name')
+        for manifest in manifests.folder(os.path.join(FILE_PATH, 'modes')).values():
+            if manifest['default_state'] in states:
+                modes.add(manifest['mode_name'])
+        old_modes = self.modes
+        self.modes = {name: mode for name, mode in old_modes.items() if name not in modes}
+        for manifest in manifests.folder(os.path.join(FILE_PATH, 'modes')).values():
+            if manifest['mode_name'] in modes:
+                mode = self.modes[manifest['mode_name']] = Mode(manifest, self)
+                if mode.id in old_modes:
+                    mode.previous_mode = old_modes[mode.id].previous_mode
+                    mode.current_state = old_modes[mode.id].current_state
+        # Point every mode to the rebuilt modes and states
+        for mode in self.modes.values():
+            if mode.previous_mode is not None:
+                mode.previous_mode = self.modes.get(mode.previous_mode.id, mode.previous_mode)
+            if mode.current_state is not None:
+                mode.current_state = self.states.get(mode.current_state.id, mode.default_state)
+        if states or modes or buttons:
+            self.event_manager.compile(self.modes, self.states)
+            self.event_manager.subscribe(sorted(set(manifests.topics) - set(previous_topics)))
+
+        # Keep the current mode and state, refresh what is displayed
+        previous_state = self.current_mode.current_state
+        self.current_mode = self.modes.get(self.current_mode.id, self.current_mode)
+        state = self.current_mode.current_state
+        if state is not previous_state or buttons & {button.id for button in self.buttons_visible}:
+            self.set_buttons(state.buttons)
+        if self.animations.active in animations:
+            self.play_anim(self.animations.active)
+        elif state.animation != previous_state.animation:
+            self.play_anim(state.animation)
+        self.prefetcher.prefetch(self.current_mode, state)
+        logging.info("Reloaded {} animations, {} buttons, {} states and {} modes".format(len(animations), len(buttons), len(states), len(modes)))
 
     def play_anim(self, animation : Union[Animation, str]):
         """ Display an animation.
@@ -168,17 +316,30 @@ class Linto_UI:
         animation -- Either an animation instance or the animation name.
         """
         if type(animation) == str:
+            self.prefetcher.record(animation)
             animation = self.animations[animation]
         
+        self.animations.active = animation.id
         self.render_sprites = animation
+        self.renderer.invalidate()
+        wake()
         
         if type(animation) is Timed_Animation:
-            t= threading.Thread(target = self._timed_animation_callback, args=(animation.duration,))
-            t.start()
+            animation.start()
+
+    def set_timeout(self, duration: float, return_state: str):
+        """ Go to return_state after duration seconds unless the state or mode changes before
+
+        Keyword arguments:
+        duration -- delay in seconds
+        return_state -- state name
+        """
+        self._state_timeouts.append(self.timers.call_later(duration, self.set_state, return_state))
 
-    def _timed_animation_callback(self, duration):
-        time.sleep(duration)
-        self.play_anim(self.current_mode.current_state.animation)
+    def _cancel_timeouts(self):
+        for handle in self._state_timeouts:
+            handle.cancel()
+        self._state_timeouts = []
 
     def set_mode(self, mode):
         """ Change the current mode
@@ -189,8 +350,11 @@ class Linto_UI:
         
         if type(mode) == str:
             mode = self.current_mode.previous_mode if mode == "last" else self.modes[mode]
+        self._cancel_timeouts()
         mode.set(self.current_mode)
         self.current_mode = mode
+        self.scheduler.set_fps(mode.fps if mode.fps is not None else FPS)
+        self.prefetcher.prefetch(mode, mode.current_state)
     
     def set_state(self, state_name: str):
         """ Change the current state
@@ -198,9 +362,10 @@ class Linto_UI:
         Keyword arguments:
         state_name -- state name.
         """
-        
+        self._cancel_timeouts()
         self.states[state_name].set()
         self.current_mode.current_state = self.states[state_name]
+        self.prefetcher.prefetch(self.current_mode, self.current_mode.current_state)
 
     def set_buttons(self, buttons):
         """ Clear visible buttons and display buttons in the list 
@@ -209,6 +374,9 @@ class Linto_UI:
         buttons -- a list of Buttons"""
         self.buttons_visible = pg.sprite.OrderedUpdates()
         self.buttons_visible.add(buttons)
+        self.hitmap.build(self.buttons_visible.sprites())
+        self.renderer.invalidate()
+        wake()
 
     def spotter_status(self, status : bool):
         """ Send a message on the pipeline on wuw_topic (defined in config file) in order to activate or deactivate wake-up-word spotting
@@ -218,109 +386,149 @@ class Linto_UI:
         """
         self.event_manager.publish(self.config["wuw_topic"], '{"on":"%(DATE)", "value":"'+ str(status) + '"}')
 
-    def update_sprites(self):
-        #Updating sprites
-        self.render_sprites.update()
-        self.overlay_sprites.update()
-        self.buttons_visible.update()
+    def update_sprites(self, ticks: int = 1):
+        """ Advance sprites of ticks frames. A finished timed animation gives way to the state animation."""
+        self.render_sprites.update(ticks)
+        if type(self.render_sprites) is Timed_Animation and self.render_sprites.finished:
+            self.play_anim(self.current_mode.current_state.animation)
+        self.overlay_sprites.update(ticks)
+        self.buttons_visible.update(ticks)
     
-    def clear_sprites(self):
-        """Clear sprites location"""
-        rects = []
-        # TODO Clear only updated buttons
-        self.overlay_sprites.clear(self.screen, self.background)
-        # Clear render_sprite TODO: clear only animated or moving sprites
-        for sprite  in self.render_sprites.sprites():
-            intersect = False
-            for rect in rects:
-                if rect.contains(sprite.rect):
-                    intersect = True
-                    break
-            if not intersect:
-                rects.append(sprite.rect)
-        
-        for sprite in self.buttons_visible.sprites():
-            intersect = False
-            for rect in rects:
-                if rect.contains(sprite.rect):
-                    intersect = True
-                    break
-            if not intersect:
-                rects.append(sprite.rect)
-        for rect in rects:
-            self.screen.blit(self.background, [rect[0], rect[1]], area=rect)
-        return rects
-    
-    def clear_screen(self):
-        self.screen.blit(self.background, [0,0])
-
-    def draw_sprites(self):
-        """Draw all visible sprites and return rect of changed areas"""
-        updated_rects = []
-
-        # Drawing
-        rect = self.render_sprites.draw(self.screen)
-        if rect is not None:
-            updated_rects.extend(rect)
-        rect = self.overlay_sprites.draw(self.screen)
-        if rect is not None:
-            updated_rects.extend(rect)
-        rect = self.buttons_visible.draw(self.screen)
-        updated_rects.extend(rect)
-
-        return updated_rects
+    def publish_stats(self):
+        """ Publish the profiler statistics on the profiler topic, then every profiler_interval seconds"""
+        stats = {'on': '%(DATE)',
+                 'fps': round(self.profiler.fps, 1),
+                 'sections': self.profiler.stats(),
+                 'event_queue': self.event_manager.queue.stats(),
+                 'assets': asset_cache.stats()}
+        self.event_manager.publish(self.config.get('profiler_topic', fallback='ui/stats'), json.dumps(stats))
+        self.timers.call_later(self.config.getint('profiler_interval', fallback=10), self.publish_stats)
 
     def play_sound(self, name):
-        def sound_playing(audio, name):
-            logging.debug("playing sound with pyaudio")
-            file_path = os.path.join(FILE_PATH, 'sounds', name +'.wav')
-            try:
-                f = wave.open(file_path)
-            except:
-                logging.error("Could not open {}".format(file_path))
-                return
-            logging.debug("Sample_rate={}, channel={}, samp_width={}".format(f.getframerate(),
-                                                                f.getnchannels(), 
-                                                                f.getsampwidth()))
-            stream = audio.open(format = audio.get_format_from_width(f.getsampwidth()),  
-                    channels = f.getnchannels(),  
-                    rate = f.getframerate(),  
-                    output = True)
-            data = f.readframes(2048)
-
-            while data:
-                stream.write(data)
-                data = f.readframes(2048)
-        
-            stream.stop_stream()
-            stream.close()
-        t = threading.Thread(target=sound_playing, args=(self.audio,name,))
-        t.start()
-
-    def inputs(self):
-        for event in pg.event.get():
-            if event.type in [pg.MOUSEBUTTONUP]:
-                mouse_sprite = pg.sprite.Sprite()
-                mouse_sprite.rect = pg.Rect( event.pos[0] -1, event.pos[1]-1, 2,2)
-                collided = pg.sprite.spritecollide(mouse_sprite, self.buttons_visible, False)
-                for sprite in collided:
-                    sprite.clicked()
+        """ Play a sound of the sounds folder"""
+        self.sounds.play(name)
+
+    def inputs(self, events: list = None):
+        """ Handle touch and keyboard events. Buttons trigger on press, or on release if touch_down is false."""
+        press_event = pg.MOUSEBUTTONDOWN if self.touch_down else pg.MOUSEBUTTONUP
+        finger_event = pg.FINGERDOWN if self.touch_down else pg.FINGERUP
+        for event in events if events is not None else pg.event.get():
+            pos = None
+            if event.type == press_event and not getattr(event, 'touch', False):
+                pos = event.pos
+            elif event.type == finger_event:
+                # Finger coordinates are normalized, mouse events emulated from touch are skipped above
+                pos = (int(event.x * self.screen_size[0]), int(event.y * self.screen_size[1]))
+            if pos is not None:
+                button = self.hitmap.hit(pos)
+                if button is not None:
+                    button.clicked()
             if event.type in [pg.KEYUP] and event.key == pg.K_ESCAPE:
-                self.event_manager.end()
+                self.end()
                 sys.exit(-1)
 
+    def end(self):
+        """ Stop the event manager and the worker threads"""
+        self.event_manager.end()
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.prefetcher.stop()
+        self.prefetcher.join()
+
     def run(self):
         """ Main loop of the program. Update sprites and catch events. 
         """
-        clock = pg.time.Clock()
         self.spotter_status(True)
-        while True:                
-            self.clear_screen()
-            self.update_sprites()
-            self.draw_sprites()
-            pg.display.update()
-            clock.tick(FPS)
-            self.inputs()
+        ticks = 1
+        profiler = self.profiler
+        while True:
+            profiler.start('update')
+            self.update_sprites(ticks)
+            profiler.stop('update')
+            groups = [self.render_sprites, self.overlay_sprites, self.buttons_visible]
+            profiler.start('render')
+            self.renderer.render(groups)
+            profiler.stop('render')
+            ticks, events = self.scheduler.wait(groups, self.timers.next_deadline())
+            profiler.start('inputs')
+            self.inputs(events)
+            profiler.stop('inputs')
+            profiler.start('events')
+            self.event_manager.process_events()
+            self.timers.run_due()
+            profiler.stop('events')
+            profiler.end_frame()
+
+def manifest_bundle_path(config) -> str:
+    """ Returns the manifest bundle file set in config.conf, None if unset"""
+    bundle = config.get('manifest_bundle', fallback='')
+    return os.path.expanduser(bundle) if bundle else None
+
+def compile_manifests(config):
+    """ Check every manifest and rebuild the manifest bundle
+
+    Keyword arguments:
+    config -- the CONFIG section of config.conf
+    """
+    bundle_path = manifest_bundle_path(config)
+    if bundle_path and os.path.exists(bundle_path):
+        os.remove(bundle_path)
+    manifests.load(bundle_path)
+    logging.info("Manifests OK{}".format(", bundle written to {}".format(bundle_path) if bundle_path else ""))
+
+def build_assets(screen: pg.Surface):
+    """ Build every animation and button for the screen size, filling the asset cache"""
+    animations = AnimationRegistry(screen, None)
+    animations.load(os.path.join(FILE_PATH, 'animations'))
+    for name in animations.keys():
+        animations.get(name)
+    for file_path in manifests.folder(os.path.join(FILE_PATH, 'buttons')).keys():
+        Button_Factory(file_path, screen, None)
+
+def bake_assets(config):
+    """ Scale every sprite and sprite sheet with smoothscale for each resolution of asset_buckets
+    and save them in the baked_assets folder.
+
+    Keyword arguments:
+    config -- the CONFIG section of config.conf
+    """
+    folder = os.path.join(FILE_PATH, os.path.expanduser(config.get('baked_assets', fallback='') or 'sprites/baked'))
+    baked = BakedAssets(folder)
+    buckets = [[int(v) for v in bucket.split('x')] for bucket in config.get('asset_buckets', fallback='800x480').split()]
+    pg.display.init()
+    asset_cache.smooth = True
+    for bucket in buckets:
+        screen = pg.display.set_mode(bucket, pg.HIDDEN)
+        asset_cache.clear()
+        build_assets(screen)
+        entries = asset_cache.scaled_entries()
+        for path, size, mode, image in entries:
+            baked.store(bucket, path, size, mode, image)
+        logging.info("Baked {} images for {}x{} in {}".format(len(entries), *bucket, folder))
+    if config.get('disk_cache', fallback=''):
+        # Scaled images of the disk cache predate the baked ones
+        DiskCache(os.path.expanduser(config['disk_cache']), buckets[0]).clear(all_resolutions=True)
+
+def build_cache(args, config):
+    """ Rebuild the on-disk cache of scaled images for the given resolution
+
+    Keyword arguments:
+    args -- parsed command line arguments
+    config -- the CONFIG section of config.conf
+    """
+    if not config.get('disk_cache', fallback=''):
+        logging.error("No disk_cache folder set in config.conf")
+        return
+    pg.display.init()
+    screen = pg.display.set_mode(args.resolution, pg.HIDDEN)
+    asset_cache.disk = DiskCache(os.path.expanduser(config['disk_cache']), args.resolution)
+    asset_cache.disk.clear()
+    if config.get('baked_assets', fallback=''):
+        baked = BakedAssets(os.path.join(FILE_PATH, os.path.expanduser(config['baked_assets'])))
+        if baked.select(args.resolution) is not None:
+            asset_cache.baked = baked
+    build_assets(screen)
+    logging.info("Cached {} scaled images for resolution {}x{} in {}".format(len(asset_cache.disk.files()), *args.resolution, asset_cache.disk.folder))
 
 def main():
     config = configparser.ConfigParser()
@@ -331,9 +539,28 @@ def main():
     parser.add_argument('-fs', '--fullscreen', help="Put display on fullscreen with hardware acceleration", action="store_true")
     parser.add_argument('-t', '--time', help="show timestamp", action="store_true")
     parser.add_argument('-db', '--debug', help="Debug mode", action="store_true")
+    parser.add_argument('-p', '--profile', help="Show frame timings on screen and publish them on the profiler topic", action="store_true")
+    parser.add_argument('--hot-reload', help="Reload the modified manifests and sprites without restarting", action="store_true")
+    parser.add_argument('--headless', help="Run offscreen without audio, mixer and MQTT broker", action="store_true")
+    parser.add_argument('--build-cache', help="Rebuild the scaled image cache for the resolution and exit", action="store_true")
+    parser.add_argument('--bake-assets', help="Scale the sprites for every resolution of asset_buckets and exit", action="store_true")
+    parser.add_argument('--compile-manifests', help="Check the manifests, rebuild the manifest bundle and exit", action="store_true")
     args = parser.parse_args()
     logging.basicConfig(level=logging.DEBUG if config['debug'] == 'true' or args.debug else logging.INFO, format="%(levelname)8s %(asctime)s %(message)s ")
-    ui = Linto_UI(args, config)
+    try:
+        if args.compile_manifests:
+            compile_manifests(config)
+            return
+        if args.bake_assets:
+            bake_assets(config)
+            return
+        if args.build_cache:
+            build_cache(args, config)
+            return
+        ui = Linto_UI(args, config)
+    except ManifestError as e:
+        logging.error(e)
+        sys.exit(1)
     ui.run()
 
 if __name__ == '__main__':